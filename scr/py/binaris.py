@@ -47,6 +47,15 @@
 # 3. Finding out how to generate valid puzzles.
 # 4. Finding out what is the minimum number of clues for a valid puzzle.
 #
+# Boards are kept as 2n x 2n NumPy arrays, with 0 or 1 on the filled cells,
+# and -1 on the empty ones. Internally, the solver numbers the lines of an
+# M x M board (M = 2n) with 0,...,M-1 for the rows and M,...,2M-1 for the
+# columns, and keeps two bitmasks for each line: the cells that hold a 1 and
+# the cells that hold a 0, where the bit j of a row is its cell on column j,
+# and the bit i of a column is its cell on row i. The three rules are then
+# checked with shifts and ANDs on the masks, counting their bits, and with a
+# hash table of the lines already completed.
+#
 
 
 
@@ -54,10 +63,35 @@
 # IMPORTS #
 ###########
 # from math import sqrt
+import argparse
+import os
+import time
+
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import accumulate, combinations
+from math import isqrt
+
+import numpy as np
+
+from puzzles import CNF, parallelMap, solveCNF
 
 ####################
 # GLOBAL VARIABLES #
 ####################
+BACKTRACKING = "BACKTRACKING"
+SAT = "SAT"
+
+EMPTY = -1 # Value of the empty cells on a board.
+
+MAX_UNIFORM = 8 # Largest side for which randomBoard is exactly uniform.
+
+_ROWS = {} # Valid rows, their columns spread on nibbles, and their successors.
+_HALVES = {} # States of the top halves of the boards, for randomBoard.
+_BOARDS = {} # Every valid board, as a single mask, for minimumClues.
+
+_PAIRS = 1 << 22 # Largest number of pairs of halves compared at once.
+_BLOCK = 1 << 12 # Groups with this many pairs are compared as a block.
 
 
 
@@ -73,6 +107,953 @@
 #################################
 #################################
 
+def binarisCNF(board):
+    # This function encodes a puzzle as a CNF formula, to be solved with
+    # puzzles.solveCNF or written for an external SAT solver. The variable
+    # M*i + j + 1 stands for the cell (i,j) having a 1, so the first M^2
+    # variables are the board. Three consecutive cells can not be all equal,
+    # each line has exactly M/2 ones (with a sequential counter), and for each
+    # pair of rows, and of columns, there is a cell where they differ, marked
+    # by an auxiliary variable that forces the two cells to be different.
+    #
+    # INPUT:
+    #  - board: An M x M NumPy array, with M even, with the clues (0 or 1),
+    #           and EMPTY on the other cells.
+    #
+    # OUTPUT:
+    #  - cnf: A puzzles.CNF object with the formula.
+    #
+    board = np.asarray(board)
+    M = board.shape[0]
+    cells = np.arange(1, M*M + 1).reshape(M, M)
+    cnf = CNF(M*M)
+    for lines in (cells.tolist(), cells.T.tolist()):
+        for line in lines:
+            for k in range(M-2):
+                cnf.addClause(line[k:k+3])
+                cnf.addClause([-a for a in line[k:k+3]])
+            cnf.exactly(line, M // 2)
+        for r in range(M):
+            for s in range(r+1, M):
+                differ = []
+                for a, b in zip(lines[r], lines[s]):
+                    d = cnf.newVariable()
+                    cnf.addClause([-d, a, b])
+                    cnf.addClause([-d, -a, -b])
+                    differ.append(d)
+                cnf.addClause(differ)
+    for (i, j), v in np.ndenumerate(board):
+        if v == 1:
+            cnf.addClause([M*i + j + 1])
+        elif v == 0:
+            cnf.addClause([-(M*i + j + 1)])
+    return cnf
+
+
+def binarisBoard(model, M):
+    # Returns the M x M board given by a model of the formula of binarisCNF.
+    board = np.zeros((M,M), dtype = np.int8)
+    for literal in model:
+        if 0 < literal <= M*M:
+            board[(literal - 1) // M, (literal - 1) % M] = 1
+    return board
+
+
+def validRows(M):
+    # Returns the list of the valid rows of length M (M/2 ones, and no three
+    # equal cells in a row), as masks of their ones, in increasing order.
+    return _rowTables(M)[0]
+
+
+def countBoards(M, distinct = True, workers = None, chunksize = 65536):
+    # This function counts the valid full M x M boards. Every board is built
+    # from the rows of validRows, and the state of its columns after some rows
+    # is given by the last row, the columns where the last two rows are equal,
+    # and the number of ones of each column (kept on a nibble per column, so
+    # M can be at most 14).
+    #
+    # Without the third rule, the boards are counted with dynamic programming:
+    # the number of ways to reach each state is carried from row to row up to
+    # the middle of the board, and, as the bottom half read upwards is just
+    # another top half, each state is matched with those that complete its
+    # counts, when their last rows do not make three in a column. The states
+    # of each row are split among processes.
+    #
+    # With the third rule, the top halves also keep the set of their rows,
+    # and the pairs of columns equal on all of them, and the states with the
+    # same set are summed (see _distinctHalves). Two halves make a board when
+    # they match as before, no pair of columns is equal on both, and their
+    # sets are disjoint. The last condition is counted by inclusion-exclusion:
+    # for each set U of u rows, the pairs of halves that share at least U are
+    # counted, with the sign of (-1)^u. The halves are split among processes
+    # by their counts, and each part is joined once for every u. This takes a
+    # couple of seconds for M = 8, and under eight minutes on a single core
+    # for M = 10 (48183195384 boards). For M = 12 the halves are too many.
+    #
+    # INPUT:
+    #  - M: An even integer, the side of the board, between 2 and 14.
+    #  - distinct: OPTIONAL, if False, the third rule (no two equal rows or
+    #              columns) is not checked.
+    #  - workers: OPTIONAL, the number of processes, as in puzzles.parallelMap.
+    #  - chunksize: OPTIONAL, the number of states sent together to a worker
+    #               (with the third rule, the least number of halves).
+    #
+    # OUTPUT:
+    #  - count: The number of boards.
+    #
+    if M % 2 or not 2 <= M <= 14:
+        raise ValueError("The side has to be even, between 2 and 14.")
+    if distinct:
+        tasks = _distinctTasks(M, chunksize)
+        return sum(parallelMap(_joinDistinct, tasks, workers))
+    states = {(a, 0, spread) : 1
+              for a, spread in enumerate(_rowTables(M)[1])}
+    for k in range(1, M // 2):
+        items = list(states.items())
+        tasks = ((M, k, items[i:i+chunksize])
+                 for i in range(0, len(items), chunksize))
+        states = defaultdict(int)
+        for part in parallelMap(_expandStates, tasks, workers):
+            for key, ways in part.items():
+                states[key] += ways
+    return _joinHalves(states, M)
+
+
+def boardWriter(board, blank = "."):
+    # This function writes a board as a single line, row by row, with 0 and 1
+    # on the filled cells, and blank on the empty ones.
+    #
+    return "".join(str(v) if v in (0, 1) else blank
+                   for v in np.asarray(board).ravel().tolist())
+
+
+def boardReader(line):
+    # This function does the opposite of boardWriter: it reads a board from a
+    # line with M^2 characters, taking anything but 0 and 1 as an empty cell.
+    #
+    line = line.strip()
+    M = isqrt(len(line))
+    if M*M != len(line) or M % 2:
+        raise ValueError("The length of the line is not a valid board size.")
+    values = {"0" : 0, "1" : 1}
+    return np.array([values.get(c, EMPTY) for c in line],
+                    dtype = np.int8).reshape(M, M)
+
+
+def allBoards(M):
+    # This generator goes through every valid full M x M board (the same ones
+    # counted by countBoards), and yields each one as the tuple of the masks
+    # of ones of its rows.
+    #
+    rows, spreads, successors = _rowTables(M)
+    checks = [_countChecks(M, k) for k in range(M)]
+    for a in range(len(rows)):
+        for path in _boardsFrom(M, 1, a, 0, spreads[a], [a], checks):
+            board = tuple(rows[b] for b in path)
+            if _distinctLines(board, M):
+                yield board
+
+
+def randomBoard(M, rng = None):
+    # This function returns a random valid full board. Up to MAX_UNIFORM, the
+    # board is uniformly random: the states of the top halves of countBoards
+    # are kept, with the number of ways to reach each one, so a top half and
+    # a bottom half that fit together are chosen with the right weights, and
+    # then each half is followed back row by row. Boards with two equal rows
+    # or columns are thrown away, which keeps the rest uniform. For larger
+    # sides, the rows are chosen at random one after the other (with
+    # backtracking), which gives every board a chance, but not the same one.
+    #
+    # INPUT:
+    #  - M: An even integer, the side of the board.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #
+    # OUTPUT:
+    #  - board: An M x M NumPy array of zeros and ones.
+    #
+    rng = np.random.default_rng(rng)
+    while True:
+        if M <= MAX_UNIFORM:
+            rows = _uniformRows(M, rng)
+        else:
+            rows = _randomRows(M, rng)
+        if rows is not None and _distinctLines(rows, M):
+            break
+    bits = (np.array(rows, dtype = np.int64)[:,None] >> np.arange(M)) & 1
+    return bits.astype(np.int8)
+
+
+def generatePuzzle(M, rng = None):
+    # This function generates a puzzle with a unique solution. It takes a
+    # board from randomBoard, and goes through its cells in a random order,
+    # emptying each one as long as the solution remains unique, so no clue
+    # of the result can be removed.
+    #
+    # INPUT:
+    #  - M: An even integer, the side of the board.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #
+    # OUTPUT:
+    #  - clues: An M x M NumPy array with the clues, and EMPTY elsewhere.
+    #  - board: The M x M NumPy array with the solution.
+    #
+    rng = np.random.default_rng(rng)
+    board = randomBoard(M, rng)
+    clues = board.copy()
+    for k in rng.permutation(M*M).tolist():
+        i, j = divmod(k, M)
+        clues[i,j] = EMPTY
+        if BinarisPuzzle(clues).countSolutions(2) != 1:
+            clues[i,j] = board[i,j]
+    return clues, board
+
+
+def generatePuzzles(M, count, workers = None, seed = None, chunksize = 4,
+                    path = None):
+    # This generator produces many puzzles with generatePuzzle, on a pool of
+    # processes. Each puzzle gets its own random generator, spawned from the
+    # seed, so the output does not depend on the number of workers. If a path
+    # is given, each puzzle is also appended to that file as soon as it is
+    # ready, and a run with the same arguments starts by yielding the puzzles
+    # already in the file, and only generates the rest.
+    #
+    # INPUT:
+    #  - M: An even integer, the side of the boards.
+    #  - count: The number of puzzles.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - seed: OPTIONAL, the seed of the whole run.
+    #  - chunksize: OPTIONAL, the number of puzzles generated by each task.
+    #  - path: OPTIONAL, the file where the puzzles are kept.
+    #
+    # OUTPUT:
+    #  - Yields each puzzle as a line written by boardWriter.
+    #
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    start = 0
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip() and start < count:
+                    start += 1
+                    yield line.strip()
+    if start == count:
+        return
+    tasks = ((M, seeds[k:k+chunksize]) for k in range(start, count, chunksize))
+    out = open(path, "a") if path is not None else None
+    try:
+        for lines in parallelMap(_generateChunk, tasks, workers):
+            for line in lines:
+                if out is not None:
+                    out.write(line + "\n")
+                    out.flush()
+                yield line
+    finally:
+        if out is not None:
+            out.close()
+
+
+def minimumClues(M, workers = None, path = None, chunksize = 8):
+    # This function finds the minimum number of clues of a puzzle with a
+    # unique solution, by going through every valid board. A set of clues
+    # taken from a board B has a unique solution if and only if, for every
+    # other board, it has a cell where the two boards differ, so the fewest
+    # clues for B are a minimum hitting set of those sets of cells, found by
+    # branch and bound. Only one board of each class of symmetry (the 8
+    # rotations and reflections of the square, with and without exchanging
+    # 0 and 1) is tried, as the rest have the same number of clues. This is
+    # only practical for sides up to 6.
+    #
+    # The boards are sent to a pool of processes, each task with the best
+    # number found so far as its bound. If a path is given, the result for
+    # each board is appended to that file, and a run with the same path goes
+    # on from where the last one stopped.
+    #
+    # INPUT:
+    #  - M: An even integer, the side of the boards.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - path: OPTIONAL, the file with the progress of the search.
+    #  - chunksize: OPTIONAL, the number of boards tried by each task.
+    #
+    # OUTPUT:
+    #  - minimum: The minimum number of clues.
+    #  - puzzles: A list with a puzzle (as a line written by boardWriter) with
+    #             that many clues for each class of boards that has one.
+    #
+    boards = _allMasks(M)
+    canonical = [k for k, board in enumerate(boards)
+                 if board == min(_symmetries(board, M))]
+    found = {}
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if fields:
+                    found[int(fields[0])] = fields[1:]
+    best = [min([len(f[0]) - f[0].count(".") for f in found.values() if f]
+                + [M*M])]
+    pending = [k for k in canonical if k not in found]
+    tasks = ((M, pending[i:i+chunksize], best)
+             for i in range(0, len(pending), chunksize))
+    out = open(path, "a") if path is not None else None
+    try:
+        for results in parallelMap(_minimumChunk, tasks, workers):
+            for k, line in results:
+                found[k] = [line] if line else []
+                if line:
+                    best[0] = min(best[0], M*M - line.count("."))
+                if out is not None:
+                    out.write("%d %s\n" % (k, line or ""))
+                    out.flush()
+    finally:
+        if out is not None:
+            out.close()
+    puzzles = [f[0] for f in found.values()
+               if f and M*M - f[0].count(".") == best[0]]
+    return best[0], puzzles
+
+
+def main(argv = None):
+    # This is the command line entry point. It counts the valid full boards of
+    # each of the sizes given, and writes each count with the time it took.
+    #
+    parser = argparse.ArgumentParser(
+        description = "Count the valid full binaris boards.")
+    parser.add_argument("sizes", type = int, nargs = "+",
+                        help = "sides of the boards (even, up to 14)")
+    parser.add_argument("-r", "--repeated", action = "store_true",
+                        help = "allow equal rows and columns (no third rule)")
+    parser.add_argument("-w", "--workers", type = int, default = None,
+                        help = "number of processes (default: all cores)")
+    args = parser.parse_args(argv)
+    for M in args.sizes:
+        start = time.time()
+        count = countBoards(M, not args.repeated, args.workers)
+        print("%d %d %.2f" % (M, count, time.time() - start), flush = True)
+
+
+###############
+###############
+##           ##
+##  PRIVATE  ##
+##           ##
+###############
+###############
+
+def _rowTables(M):
+    # Returns (and caches) the valid rows of length M, the same rows with the
+    # bit of each column moved to the lowest bit of its nibble (so adding them
+    # counts the ones of each column), and a dictionary for the successors of
+    # each state, filled by _successors.
+    if M not in _ROWS:
+        full = (1 << M) - 1
+        rows = []
+        for row in range(1 << M):
+            zeros = full & ~row
+            if bin(row).count("1") == M // 2 and \
+               not row & (row >> 1) & (row >> 2) and \
+               not zeros & (zeros >> 1) & (zeros >> 2):
+                rows.append(row)
+        spreads = [sum(((row >> j) & 1) << (4*j) for j in range(M))
+                   for row in rows]
+        _ROWS[M] = (rows, spreads, {})
+    return _ROWS[M]
+
+
+def _successors(M, a, same):
+    # Returns (and caches) the rows that can follow the row a (an index of
+    # validRows), when the columns where the last two rows are equal are the
+    # bits of same, as pairs of the index of the row and the new same.
+    rows, spreads, successors = _rowTables(M)
+    key = (a, same)
+    if key not in successors:
+        full = (1 << M) - 1
+        last = rows[a]
+        successors[key] = [(b, full & ~(row ^ last))
+                           for b, row in enumerate(rows)
+                           if not same & ~(row ^ last) & full]
+    return successors[key]
+
+
+def _countChecks(M, k):
+    # Returns the numbers that check the counts of the columns (one nibble
+    # each) after k+1 rows: adding the first one sets the high bit of a nibble
+    # with more than M/2 ones, and adding the second one, if any, leaves it
+    # unset on a nibble with more than M/2 zeros. The high bits are the third.
+    n = M // 2
+    one = sum(1 << (4*j) for j in range(M))
+    low = k + 1 - n
+    return (7 - n)*one, ((8 - low)*one if low > 0 else None), 8*one
+
+
+def _expandStates(task):
+    # Adds a row to the states of one task of countBoards, and returns the
+    # dictionary with the number of ways to reach each new state.
+    M, k, items = task
+    spreads = _rowTables(M)[1]
+    high, low, bits = _countChecks(M, k)
+    states = defaultdict(int)
+    for (a, same, counts), ways in items:
+        for b, newSame in _successors(M, a, same):
+            newCounts = counts + spreads[b]
+            if newCounts + high & bits:
+                continue
+            if low is not None and newCounts + low & bits != bits:
+                continue
+            states[(b, newSame, newCounts)] += ways
+    return states
+
+
+def _joinHalves(states, M):
+    # Counts the boards made of two halves, given the states after the first
+    # M/2 rows: the bottom half, upside down, has the counts that complete
+    # those of the top one, and the last row of each half can not be equal to
+    # the other one on a column where the two last rows of either half are.
+    rows = _rowTables(M)[0]
+    full = (1 << M) - 1
+    total = (M // 2)*sum(1 << (4*j) for j in range(M))
+    groups = defaultdict(list)
+    for (a, same, counts), ways in states.items():
+        groups[counts].append((rows[a], same, ways))
+    count = 0
+    for counts, top in groups.items():
+        bottom = groups.get(total - counts, [])
+        for row, same, ways in top:
+            for other, otherSame, otherWays in bottom:
+                if not (same | otherSame) & full & ~(row ^ other):
+                    count += ways*otherWays
+    return count
+
+
+def _groupSum(keys, ways):
+    # Sorts the rows of the 2D array keys, and returns the different ones with
+    # the sums of the ways of each.
+    if not len(keys):
+        return keys, ways
+    order = np.lexsort(keys.T[::-1])
+    keys, ways = keys[order], ways[order]
+    starts = np.flatnonzero(np.concatenate(
+        [[True], (keys[1:] != keys[:-1]).any(1)]))
+    return keys[starts], np.add.reduceat(ways, starts)
+
+
+def _equalColumns(M):
+    # Returns, for each valid row, the bits of the pairs of columns that are
+    # equal on it, on words of 63 bits (so they stay positive on int64).
+    rows = _rowTables(M)[0]
+    pairs = [(i, j) for i in range(M) for j in range(i+1, M)]
+    table = np.zeros((len(rows), (len(pairs) + 62) // 63), dtype = np.int64)
+    for r, row in enumerate(rows):
+        for p, (i, j) in enumerate(pairs):
+            if not ((row >> i) ^ (row >> j)) & 1:
+                table[r, p // 63] |= 1 << (p % 63)
+    return table
+
+
+def _distinctHalves(M):
+    # Returns the top halves (the first M/2 rows, all different) of the boards
+    # with the first two rules, as NumPy arrays: the sorted indices of their
+    # rows, their last row, the columns where their last two rows are equal,
+    # and the number of orders of the rows that give them. Any other half
+    # with the same three is the same for the rest of the board.
+    rows = _rowTables(M)[0]
+    sets = np.arange(len(rows)).reshape(-1, 1)
+    last = sets[:,0].copy()
+    same = np.zeros(len(rows), dtype = np.int64)
+    ways = np.ones(len(rows), dtype = np.int64)
+    for k in range(1, M // 2):
+        states, inverse = np.unique((last << M) | same, return_inverse = True)
+        lists = [_successors(M, state >> M, state & ((1 << M) - 1))
+                 for state in states.tolist()]
+        sizes = np.array([len(successors) for successors in lists])
+        flat = np.array([pair for successors in lists for pair in successors],
+                        dtype = np.int64).reshape(-1, 2)
+        sizes, starts = sizes[inverse], (np.cumsum(sizes) - sizes)[inverse]
+        parent = np.repeat(np.arange(len(last)), sizes)
+        offset = np.arange(len(parent)) - np.repeat(np.cumsum(sizes) - sizes,
+                                                    sizes)
+        succ = flat[np.repeat(starts, sizes) + offset]
+        keep = ~(sets[parent] == succ[:,:1]).any(1)
+        parent, succ = parent[keep], succ[keep]
+        newSets = np.sort(np.concatenate([sets[parent], succ[:,:1]], 1), 1)
+        keys, ways = _groupSum(np.concatenate([newSets, succ], 1),
+                               ways[parent])
+        sets, last, same = keys[:,:k+1], keys[:,k+1], keys[:,k+2]
+    return sets, last, same, ways
+
+
+def _distinctTasks(M, chunksize):
+    # Yields the tasks of _joinDistinct: the halves whose counts can be
+    # completed by another one, with the index of their class of counts and
+    # of the class that completes it, in parts of at least chunksize halves
+    # that do not split a pair of classes, once for each size of U.
+    sets, last, same, ways = _distinctHalves(M)
+    spreads = np.array(_rowTables(M)[1], dtype = np.int64)
+    equal = np.bitwise_and.reduce(_equalColumns(M)[sets], axis = 1)
+    classes, cls = np.unique(spreads[sets].sum(1), return_inverse = True)
+    total = (M // 2)*sum(1 << (4*j) for j in range(M))
+    other = np.searchsorted(classes, total - classes) % len(classes)
+    other = np.where(classes[other] == total - classes, other, -1)[cls]
+    keep = other >= 0
+    sets, last, same, ways, equal = (sets[keep], last[keep], same[keep],
+                                     ways[keep], equal[keep])
+    cls, other = cls[keep], other[keep]
+    pair = np.minimum(cls, other)
+    order = np.argsort(pair, kind = "stable")
+    cuts = [0]
+    for cut in (np.flatnonzero(np.diff(pair[order])) + 1).tolist():
+        if cut - cuts[-1] >= chunksize:
+            cuts.append(cut)
+    cuts.append(len(order))
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        part = order[start:end]
+        for u in range(M // 2 + 1):
+            yield (M, u, sets[part], last[part], same[part], ways[part],
+                   cls[part], other[part], equal[part])
+
+
+def _joinDistinct(task):
+    # Counts, with the sign of (-1)^u, the pairs of halves of one task of
+    # countBoards that make a board with the three rules, except that their
+    # rows may be repeated, and that have at least a given set U of u rows in
+    # common, added over every U. The halves are grouped by their class and
+    # U, and each group is compared with the one of the complementary class
+    # and the same U: the big ones as a block, the rest pair by pair.
+    M, u, sets, last, same, ways, cls, other, equal = task
+    rows = np.array(_rowTables(M)[0], dtype = np.int64)
+    full = (1 << M) - 1
+    picks = list(combinations(range(M // 2), u))
+    index = np.tile(np.arange(len(ways)), len(picks))
+    subset = np.zeros(len(index), dtype = np.int64)
+    for t in range(u):
+        column = np.concatenate([sets[:, pick[t]] for pick in picks])
+        subset = np.unique(subset*len(rows) + column,
+                           return_inverse = True)[1].reshape(-1)
+    size = int(subset.max()) + 1
+    key = cls[index]*size + subset
+    partner = other[index]*size + subset
+    keep = np.isin(partner, key)
+    if not keep.any():
+        return 0
+    index, key, partner = index[keep], key[keep], partner[keep]
+    keys, ways = _groupSum(np.column_stack(
+        [key, partner, (last[index] << M) | same[index], equal[index]]),
+                           ways[index])
+    starts = np.flatnonzero(np.concatenate(
+        [[True], keys[1:,0] != keys[:-1,0]]))
+    sizes = np.diff(np.append(starts, len(keys)))
+    group, match = keys[starts,0], keys[starts,1]
+    top = np.flatnonzero(group <= match)
+    bottom = np.searchsorted(group, match[top])
+    twice = np.where(group[top] < match[top], 2, 1)
+    topSize, bottomSize = sizes[top], sizes[bottom]
+    top, bottom = starts[top], starts[bottom]
+    last, same, equal = rows[keys[:,2] >> M], keys[:,2] & full, keys[:,3:]
+    count = 0
+    block = topSize*bottomSize >= _BLOCK
+    for x, n, y, m, factor in zip(top[block].tolist(),
+                                  topSize[block].tolist(),
+                                  bottom[block].tolist(),
+                                  bottomSize[block].tolist(),
+                                  twice[block].tolist()):
+        otherLast, otherSame = last[y:y+m], same[y:y+m]
+        otherEqual, otherWays = equal[y:y+m], ways[y:y+m]
+        step = max(1, _PAIRS // m)
+        for i in range(x, x + n, step):
+            j = min(x + n, i + step)
+            fits = (same[i:j,None] | otherSame) & ~(last[i:j,None] ^ otherLast)
+            fits = fits & full == 0
+            for word in range(equal.shape[1]):
+                fits &= equal[i:j,word,None] & otherEqual[:,word] == 0
+            count += factor*int(ways[i:j] @ (fits @ otherWays))
+    top, topSize, twice = top[~block], topSize[~block], twice[~block]
+    bottom, bottomSize = bottom[~block], bottomSize[~block]
+    pairs = topSize*bottomSize
+    ends = np.cumsum(pairs)
+    start = 0
+    while start < len(ends):
+        done = ends[start - 1] if start else 0
+        end = int(np.searchsorted(ends, done + _PAIRS, "right"))
+        end = max(start + 1, end)
+        group = np.repeat(np.arange(start, end), pairs[start:end])
+        k = np.arange(len(group)) - np.repeat(ends[start:end] - done
+                                              - pairs[start:end],
+                                              pairs[start:end])
+        x = top[group] + k // bottomSize[group]
+        y = bottom[group] + k % bottomSize[group]
+        fits = (same[x] | same[y]) & ~(last[x] ^ last[y]) & full == 0
+        fits &= (equal[x] & equal[y] == 0).all(1)
+        count += int((ways[x]*ways[y]*twice[group])[fits].sum())
+        start = end
+    return -count if u % 2 else count
+
+
+def _boardsFrom(M, k, a, same, counts, path, checks):
+    # Yields the lists of the indices of the rows of the boards (with the
+    # first two rules, and distinct rows) that complete the first k rows, the
+    # indices on path, whose last one is a.
+    if k == M:
+        yield list(path)
+        return
+    spreads = _rowTables(M)[1]
+    high, low, bits = checks[k]
+    for b, newSame in _successors(M, a, same):
+        if b in path:
+            continue
+        newCounts = counts + spreads[b]
+        if newCounts + high & bits:
+            continue
+        if low is not None and newCounts + low & bits != bits:
+            continue
+        path.append(b)
+        yield from _boardsFrom(M, k+1, b, newSame, newCounts, path, checks)
+        path.pop()
+
+
+def _distinctLines(rows, M):
+    # Returns True if the rows (masks of ones) are all different, and so are
+    # the columns they make.
+    columns = [sum(((row >> j) & 1) << i for i, row in enumerate(rows))
+               for j in range(M)]
+    return len(set(rows)) == M and len(set(columns)) == M
+
+
+def _halves(M):
+    # Returns (and caches) what randomBoard needs to choose uniform boards of
+    # side M: the states of each of the first M/2 rows with the number of ways
+    # to reach them, the same states grouped by their last row and counts (to
+    # follow them back), the last states grouped by their counts, and the last
+    # states with the accumulated numbers of boards that start with them.
+    if M not in _HALVES:
+        rows, spreads, successors = _rowTables(M)
+        full = (1 << M) - 1
+        total = (M // 2)*sum(1 << (4*j) for j in range(M))
+        levels = [{(a, 0, spread) : 1 for a, spread in enumerate(spreads)}]
+        for k in range(1, M // 2):
+            levels.append(_expandStates((M, k, list(levels[-1].items()))))
+        back = []
+        for level in levels:
+            index = defaultdict(list)
+            for (a, same, counts), ways in level.items():
+                index[(a, counts)].append((same, ways))
+            back.append(index)
+        groups = defaultdict(list)
+        for state, ways in levels[-1].items():
+            groups[state[2]].append((state, ways))
+        tops = []
+        weights = []
+        for (a, same, counts), ways in levels[-1].items():
+            fits = sum(w for (b, s, c), w in groups[total - counts]
+                       if not (same | s) & full & ~(rows[a] ^ rows[b]))
+            if fits:
+                tops.append((a, same, counts))
+                weights.append(ways*fits)
+        _HALVES[M] = (back, groups, tops, list(accumulate(weights)))
+    return _HALVES[M]
+
+
+def _uniformRows(M, rng):
+    # Returns the rows of a uniformly random board with the first two rules,
+    # chosen with the states of _halves.
+    rows = _rowTables(M)[0]
+    full = (1 << M) - 1
+    total = (M // 2)*sum(1 << (4*j) for j in range(M))
+    back, groups, tops, weights = _halves(M)
+    pick = int(rng.integers(weights[-1]))
+    a, same, counts = tops[bisect_right(weights, pick)]
+    fits = [(state, w) for state, w in groups[total - counts]
+            if not (same | state[1]) & full & ~(rows[a] ^ rows[state[0]])]
+    bottom = _weightedChoice(fits, rng)
+    return _halfRows((a, same, counts), M, rng) + \
+           _halfRows(bottom, M, rng)[::-1]
+
+
+def _halfRows(state, M, rng):
+    # Follows a state of _halves back to the first row, choosing each previous
+    # state with the number of ways to reach it, and returns the rows.
+    rows, spreads, successors = _rowTables(M)
+    full = (1 << M) - 1
+    back = _halves(M)[0]
+    a, same, counts = state
+    path = [rows[a]]
+    for k in range(len(back) - 1, 0, -1):
+        previous = bisect_right(rows, rows[a] ^ (full & ~same)) - 1
+        counts -= spreads[a]
+        options = [(s, w) for s, w in back[k-1][(previous, counts)]
+                   if not s & same]
+        a, same = previous, _weightedChoice(options, rng)
+        path.append(rows[a])
+    return path[::-1]
+
+
+def _weightedChoice(options, rng):
+    # Returns the first element of one of the pairs of options, chosen with
+    # probability proportional to the second one.
+    r = int(rng.integers(sum(w for option, w in options)))
+    for option, w in options:
+        if r < w:
+            return option
+        r -= w
+
+
+def _randomRows(M, rng):
+    # Returns the rows of a valid board, chosen one after the other at random
+    # among the ones that can follow, with backtracking, or None if the first
+    # row chosen can not start a board.
+    rows, spreads, successors = _rowTables(M)
+    checks = [_countChecks(M, k) for k in range(M)]
+    a = int(rng.integers(len(rows)))
+    path = _randomFrom(M, 1, a, 0, spreads[a], [a], checks, rng)
+    return None if path is None else [rows[b] for b in path]
+
+
+def _randomFrom(M, k, a, same, counts, path, checks, rng):
+    # Completes the first k rows, the indices on path, trying the rows that
+    # can follow in a random order. Returns the full path, or None.
+    if k == M:
+        rows = _rowTables(M)[0]
+        return path if _distinctLines([rows[b] for b in path], M) else None
+    spreads = _rowTables(M)[1]
+    high, low, bits = checks[k]
+    following = _successors(M, a, same)
+    for p in rng.permutation(len(following)).tolist():
+        b, newSame = following[p]
+        if b in path:
+            continue
+        newCounts = counts + spreads[b]
+        if newCounts + high & bits:
+            continue
+        if low is not None and newCounts + low & bits != bits:
+            continue
+        path.append(b)
+        if _randomFrom(M, k+1, b, newSame, newCounts, path, checks, rng):
+            return path
+        path.pop()
+    return None
+
+
+def _generateChunk(task):
+    # Generates the puzzles of one task of generatePuzzles, and returns them as
+    # lines.
+    M, seeds = task
+    return [boardWriter(generatePuzzle(M, np.random.default_rng(seed))[0])
+            for seed in seeds]
+
+
+def _allMasks(M):
+    # Returns (and caches) the list of every valid board, each one as a single
+    # mask, with the cell (i,j) on the bit M*i + j.
+    if M not in _BOARDS:
+        _BOARDS[M] = [sum(row << (M*i) for i, row in enumerate(board))
+                      for board in allBoards(M)]
+    return _BOARDS[M]
+
+
+def _symmetries(board, M):
+    # Returns the 16 images of a board (as a single mask) by the rotations and
+    # reflections of the square, with and without exchanging 0 and 1.
+    cells = [(board >> c) & 1 for c in range(M*M)]
+    images = []
+    for transpose in (False, True):
+        for flipRows in (False, True):
+            for flipColumns in (False, True):
+                mask = 0
+                for i in range(M):
+                    for j in range(M):
+                        r = M - 1 - i if flipRows else i
+                        c = M - 1 - j if flipColumns else j
+                        if transpose:
+                            r, c = c, r
+                        mask |= cells[M*r + c] << (M*i + j)
+                images.append(mask)
+    full = (1 << (M*M)) - 1
+    return images + [full ^ mask for mask in images]
+
+
+def _minimumChunk(task):
+    # Finds the fewest clues of each board of one task of minimumClues, when
+    # they are less than the bound plus one. Returns a list with the index of
+    # each board and a puzzle with those clues (or None).
+    M, indices, bound = task
+    boards = _allMasks(M)
+    results = []
+    for k in indices:
+        board = boards[k]
+        differences = [board ^ other for other in boards if other != board]
+        size, clues = _hittingSet(differences, 0, 0, 0, bound[0] + 1)
+        line = None
+        if clues is not None:
+            puzzle = [(board >> c) & 1 if (clues >> c) & 1 else EMPTY
+                      for c in range(M*M)]
+            line = boardWriter(puzzle)
+        results.append((k, line))
+    return results
+
+
+def _hittingSet(sets, chosen, size, excluded, bound):
+    # Finds a set of fewer than bound cells, that contains the cells of chosen
+    # and none of excluded, and meets every one of the sets (masks of cells).
+    # The smallest set that is not met yet is taken, and each of its cells is
+    # tried in turn, excluding the ones tried before it. A family of disjoint
+    # sets not met yet needs one cell each, which bounds the search. Returns
+    # the size and the set found, or the bound and None.
+    remaining = [s & ~excluded for s in sets if not s & chosen]
+    if not remaining:
+        return size, chosen
+    if 0 in remaining:
+        return bound, None
+    remaining.sort(key = lambda s: bin(s).count("1"))
+    disjoint = 0
+    covered = 0
+    for s in remaining:
+        if not s & covered:
+            disjoint += 1
+            covered |= s
+    if size + disjoint >= bound:
+        return bound, None
+    best = None
+    cells = remaining[0]
+    while cells:
+        cell = cells & -cells
+        cells ^= cell
+        found, result = _hittingSet(remaining, chosen | cell, size + 1,
+                                    excluded, bound)
+        if result is not None:
+            bound, best = found, result
+        excluded |= cell
+    return bound, best
+
+
+def _lineRules(ones, zeros, M):
+    # Applies the first two rules to a single line, given its masks, until
+    # nothing changes. Two equal cells next to each other, or with one cell
+    # between them, force the opposite value on the cells that would make
+    # three in a row, and a line with M/2 cells of one value has the opposite
+    # one on the rest. Returns the new masks, or None on a contradiction.
+    full = (1 << M) - 1
+    half = M // 2
+    while True:
+        if ones & zeros:
+            return None
+        if ones & (ones >> 1) & (ones >> 2) or \
+           zeros & (zeros >> 1) & (zeros >> 2):
+            return None
+        countOnes = bin(ones).count("1")
+        countZeros = bin(zeros).count("1")
+        if countOnes > half or countZeros > half:
+            return None
+        pairs = ones & (ones >> 1)
+        newZeros = (pairs << 2) | (pairs >> 1) | ((ones & (ones >> 2)) << 1)
+        pairs = zeros & (zeros >> 1)
+        newOnes = (pairs << 2) | (pairs >> 1) | ((zeros & (zeros >> 2)) << 1)
+        if countOnes == half:
+            newZeros |= ~ones
+        if countZeros == half:
+            newOnes |= ~zeros
+        newZeros &= full & ~zeros
+        newOnes &= full & ~ones
+        if not newZeros and not newOnes:
+            return ones, zeros
+        ones |= newOnes
+        zeros |= newZeros
+
+
+def _propagate(ones, zeros, done, M, queue):
+    # Applies the three rules to the lines on the queue (a list of line
+    # indices), and to the ones they change, until nothing changes. The lists
+    # ones and zeros hold the masks of the 2M lines, and done is a pair of
+    # dictionaries, from the masks of ones of the completed rows (and
+    # columns) to their indices. A completed line can not be in its
+    # dictionary under another index, and a line with two empty cells, that
+    # must take a 1 and a 0, can not be completed into one that is.
+    # Everything is changed in place. Returns False if a contradiction is
+    # found.
+    full = (1 << M) - 1
+    half = M // 2
+    waiting = set(queue)
+    while queue:
+        L = queue.pop()
+        waiting.discard(L)
+        side = L // M
+        result = _lineRules(ones[L], zeros[L], M)
+        if result is None:
+            return False
+        newOnes, newZeros = result
+        filled = newOnes | newZeros
+        again = False
+        if filled == full:
+            if done[side].setdefault(newOnes, L) != L:
+                return False
+        elif bin(filled).count("1") == M - 2 and \
+             bin(newOnes).count("1") == half - 1:
+            empty = full & ~filled
+            for line in done[side]:
+                if line & filled == newOnes:
+                    newOnes |= empty & ~line
+                    newZeros |= empty & line
+                    again = True
+                    break
+        changedOnes = newOnes & ~ones[L]
+        changedZeros = newZeros & ~zeros[L]
+        ones[L] = newOnes
+        zeros[L] = newZeros
+        bit = 1 << (L - side*M)
+        across = (1 - side)*M
+        for changed, masks, others in ((changedOnes, ones, zeros),
+                                       (changedZeros, zeros, ones)):
+            while changed:
+                low = changed & -changed
+                changed ^= low
+                K = across + low.bit_length() - 1
+                if others[K] & bit:
+                    return False
+                if not masks[K] & bit:
+                    masks[K] |= bit
+                    if K not in waiting:
+                        waiting.add(K)
+                        queue.append(K)
+        if again and L not in waiting:
+            waiting.add(L)
+            queue.append(L)
+    return True
+
+
+def _search(ones, zeros, done, M, limit, solutions, nodes):
+    # This is the backtracking part of the solver. The first empty cell of the
+    # row with the fewest empty cells is tried with a 0 and with a 1, each on
+    # a copy of the masks, which is propagated before going deeper. The
+    # solutions are appended (as their lists of row masks of ones) until there
+    # are limit of them, and nodes is a list with a single integer, the number
+    # of values tried.
+    full = (1 << M) - 1
+    best = None
+    fewest = M + 1
+    for L in range(M):
+        empty = bin(full & ~(ones[L] | zeros[L])).count("1")
+        if 0 < empty < fewest:
+            best = L
+            fewest = empty
+    if best is None:
+        solutions.append(ones[:M])
+        return
+    empty = full & ~(ones[best] | zeros[best])
+    bit = empty & -empty
+    column = M + bit.bit_length() - 1
+    for value in (0, 1):
+        nodes[0] += 1
+        newOnes = list(ones)
+        newZeros = list(zeros)
+        newDone = (dict(done[0]), dict(done[1]))
+        masks = newOnes if value else newZeros
+        masks[best] |= bit
+        masks[column] |= 1 << best
+        if _propagate(newOnes, newZeros, newDone, M, [best, column]):
+            _search(newOnes, newZeros, newDone, M, limit, solutions, nodes)
+            if len(solutions) >= limit:
+                return
+
+
 ###################
 ###################
 ###################
@@ -84,3 +1065,186 @@
 ###################
 ###################
 ###################
+
+
+###########################
+###########################
+##                       ##
+##  CLASS BINARISPUZZLE  ##
+##                       ##
+###########################
+###########################
+class BinarisPuzzle:
+    # This class contains the clues and the board of a binaris puzzle, and the
+    # logic necessary to solve it. The board is kept as the masks of ones and
+    # zeros of its rows and columns (see the description of the module), that
+    # are propagated as soon as the puzzle is created.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    __slots__ = ("_size", "_clues", "_ones", "_zeros", "_done", "_viable",
+                 "_nodes")
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, clues):
+        # This is the creator of the class.
+        #
+        # INPUT:
+        #  - clues: An M x M NumPy array (or list of lists), with M even, with
+        #           the clues (0 or 1), and EMPTY on the other cells. It is
+        #           copied.
+        #
+        clues = np.array(clues, dtype = np.int8)
+        M = clues.shape[0]
+        if clues.shape != (M, M) or M % 2:
+            raise ValueError("The board has to be square, with an even side.")
+        self._size = M
+        self._clues = clues
+        self._ones = [0]*(2*M)
+        self._zeros = [0]*(2*M)
+        self._done = ({}, {})
+        self._nodes = 0
+        for (i, j), v in np.ndenumerate(clues):
+            if v == 1:
+                self._ones[i] |= 1 << j
+                self._ones[M+j] |= 1 << i
+            elif v == 0:
+                self._zeros[i] |= 1 << j
+                self._zeros[M+j] |= 1 << i
+        self._viable = _propagate(self._ones, self._zeros, self._done, M,
+                                  list(range(2*M)))
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getSize(self):
+        # Returns the size (M) of the side of the board.
+        return self._size
+
+    def getClues(self):
+        # Returns the array with the original clues.
+        return self._clues
+
+    def getBoard(self):
+        # Returns the board in the current state, as an M x M NumPy array
+        # with EMPTY on the cells that are not known.
+        M = self._size
+        bits = 1 << np.arange(M, dtype = np.int64)
+        ones = (np.array(self._ones[:M], dtype = np.int64)[:,None] & bits) > 0
+        zeros = (np.array(self._zeros[:M], dtype = np.int64)[:,None] & bits) > 0
+        board = np.full((M,M), EMPTY, dtype = np.int8)
+        board[ones] = 1
+        board[zeros] = 0
+        return board
+
+    def getNodes(self):
+        # Returns the number of values tried by the last search.
+        return self._nodes
+
+    def isViable(self):
+        # Returns False if the puzzle has been found to have no solution.
+        return self._viable
+
+
+    ###########
+    # METHODS #
+    ###########
+    def fullBoard(self):
+        # This method returns True if and only if every cell is known.
+        full = (1 << self._size) - 1
+        return all(o | z == full for o, z in
+                   zip(self._ones[:self._size], self._zeros[:self._size]))
+
+    def solve(self, strategy = BACKTRACKING):
+        # This method invokes the different methods of solution for the puzzle,
+        # and returns True if and only if the board could be completed.
+        #
+        # INPUT:
+        #  - strategy: A string that specifies the solution strategy to follow.
+        #
+        if strategy == BACKTRACKING:
+            return self.backtrackingSolve()
+        if strategy == SAT:
+            return self.satSolve()
+        raise ValueError("Unknown strategy: " + str(strategy))
+
+    def backtrackingSolve(self):
+        # This method completes the board with the first solution found by
+        # propagation and backtracking, if there is any. Otherwise the puzzle
+        # is marked as not viable.
+        #
+        solutions = self._solutions(1)
+        if not solutions:
+            self._viable = False
+            return False
+        self._setRows(solutions[0])
+        return True
+
+    def countSolutions(self, limit = 2):
+        # This method counts the solutions of the puzzle, up to the limit,
+        # starting from the current (already propagated) state. The board is
+        # not modified.
+        #
+        # INPUT:
+        #  - limit: OPTIONAL, the number of solutions after which the count
+        #           stops.
+        #
+        return len(self._solutions(limit))
+
+    def satSolve(self, solver = None, timeout = None):
+        # This method completes the board with a model of the formula of
+        # binarisCNF, found by an external SAT solver or, if none is given, by
+        # puzzles.dpll.
+        #
+        # INPUT:
+        #  - solver: OPTIONAL, the command of the SAT solver, as in
+        #            puzzles.solveCNF.
+        #  - timeout: OPTIONAL, the number of seconds the solver can run.
+        #
+        self._nodes = 0
+        if not self._viable:
+            return False
+        model = solveCNF(binarisCNF(self.getBoard()), solver, timeout)
+        if model is None:
+            self._viable = False
+            return False
+        board = binarisBoard(model, self._size)
+        self._setRows([int((row << np.arange(self._size)).sum())
+                       for row in board.astype(np.int64)])
+        return True
+
+    def _solutions(self, limit):
+        # Returns a list with up to limit solutions (as lists of the masks of
+        # ones of the rows), found by the search of backtrackingSolve.
+        self._nodes = 0
+        if not self._viable:
+            return []
+        solutions = []
+        nodes = [0]
+        _search(self._ones, self._zeros, self._done, self._size, limit,
+                solutions, nodes)
+        self._nodes = nodes[0]
+        return solutions
+
+    def _setRows(self, rows):
+        # Sets the board to the full one with the given masks of ones of its
+        # rows.
+        M = self._size
+        full = (1 << M) - 1
+        columns = [sum(((rows[i] >> j) & 1) << i for i in range(M))
+                   for j in range(M)]
+        self._ones = list(rows) + columns
+        self._zeros = [full & ~line for line in self._ones]
+        self._done = ({line : k for k, line in enumerate(rows)},
+                      {line : M+k for k, line in enumerate(columns)})
+
+
+
+if __name__ == "__main__":
+    main()
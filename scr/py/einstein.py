@@ -122,6 +122,416 @@
 #
 # Any permutation of the columns should be also acceptable.
 #
+# The solver keeps, for each pair of categories a and b, an N x N boolean
+# matrix whose entry (i,j) tells if the option i of a may still be in the same
+# column as the option j of b, all of them in a single M x M x N x N NumPy
+# array. A positive clue leaves a single True on a row and on a column of one
+# of the matrices, and a negative one clears a single entry. Those matrices are
+# then reduced until nothing changes: an option with a single partner on
+# another category takes that partner away from the other options, and the
+# option i of a can only go with the option k of c if, for every category b,
+# some option of b can go with both, which is checked for all the triples of
+# categories at once with matrix products. When that is not enough, the search
+# tries the partners of an option of the first category.
+#
+# The clues are compiled into a structured NumPy array (one record of five
+# bytes per clue, with the categories and options counted from 0). A clue only
+# clears entries of the matrices, so it is applied once, and never looked at
+# again. The reduction works from a list of the pairs of categories whose
+# matrix has changed: only the products that use a changed matrix are
+# computed again, so adding a clue, or fixing a partner during the search,
+# wakes only the pairs of categories it touches.
+#
+# New puzzles are made from a random hidden solution: its facts (every pair of
+# options that are, or are not, in the same column) are shuffled and added one
+# at a time, skipping those that are already deduced, until propagation alone
+# determines the solution. The state after each kept clue is saved, and the
+# clues are then tried for removal from the last to the first, each time from
+# the saved state before the clue, adding only the later clues that were
+# kept. Since propagation can only deduce more from more clues, the result is
+# minimal: no clue can be dropped and still leave the solution determined by
+# propagation.
+#
+
+
+###########
+# IMPORTS #
+###########
+import argparse
+import re
+import time
+
+import numpy as np
+
+from puzzles import parallelMap
+
+####################
+# GLOBAL VARIABLES #
+####################
+# The clues of the example above, in the list syntax.
+EXAMPLE = """
+[False [4 3] [5 4] ]
+[True [1 2] [4 1] ]
+[True [1 1] [5 4] ]
+[False [1 3] [4 4] ]
+[False [3 3] [5 3] ]
+[False [3 5] [5 2] ]
+[False [4 2] [3 3] ]
+[False [3 5] [4 3] ]
+[False [3 3] [4 5] ]
+[True [2 1] [5 2] ]
+[False [5 5] [4 4] ]
+[False [5 5] [4 2] ]
+[False [5 4] [4 2] ]
+[True [1 5] [4 3] ]
+[False [5 4] [3 3] ]
+[False [3 1] [4 3] ]
+[False [2 5] [5 5] ]
+[False [4 2] [5 3] ]
+[True [1 1] [2 2] ]
+[False [4 3] [3 3] ]
+[True [2 3] [4 3] ]
+[True [2 5] [3 4] ]
+[False [5 1] [4 2] ]
+[False [4 1] [3 3] ]
+[True [4 3] [3 2] ]
+[True [1 2] [2 5] ]
+[False [2 5] [4 3] ]
+[False [2 3] [3 3] ]
+"""
+
+CLUE_DTYPE = np.dtype([("positive", np.bool_), ("category1", np.uint8),
+                       ("option1", np.uint8), ("category2", np.uint8),
+                       ("option2", np.uint8)])
+
+_CLUE = re.compile(r"\[\s*(True|False)\s*\[\s*(\d+)\s+(\d+)\s*\]"
+                   r"\s*\[\s*(\d+)\s+(\d+)\s*\]\s*\]")
+
+
+
+#################################
+#################################
+#################################
+###                           ###
+###                           ###
+###   METHODS AND FUNCTIONS   ###
+###                           ###
+###                           ###
+#################################
+#################################
+#################################
+
+def clueReader(text):
+    # This function reads clues written in the list syntax described above,
+    # [posneg [cathegory1 option1] [cathegory2 option2] ], with the categories
+    # and options counted from 1. Anything between the clues is ignored.
+    #
+    # INPUT:
+    #  - text: A string with any number of clues.
+    #
+    # OUTPUT:
+    #  - clues: A list of Clue objects.
+    #
+    return [Clue(posneg == "True", int(c1), int(o1), int(c2), int(o2))
+            for posneg, c1, o1, c2, o2 in _CLUE.findall(text)]
+
+
+def clueWriter(clue):
+    # This function writes a clue in the list syntax.
+    return "[%s [%d %d] [%d %d] ]" % ((clue.isPositive(),) + clue.getFirst()
+                                      + clue.getSecond())
+
+
+def compileClues(clues):
+    # This function compiles a list of clues into a structured array with the
+    # dtype CLUE_DTYPE, with the categories and options counted from 0.
+    #
+    table = np.zeros(len(clues), dtype = CLUE_DTYPE)
+    for k, clue in enumerate(clues):
+        (a, i), (b, j) = clue.getFirst(), clue.getSecond()
+        table[k] = (clue.isPositive(), a-1, i-1, b-1, j-1)
+    return table
+
+
+def solutionWriter(solution):
+    # This function writes a solution (an M x N matrix) in the format above.
+    rows = ["  [ " + " ".join(str(v) for v in row) + " ]"
+            for row in np.asarray(solution).tolist()]
+    return "[\n" + "\n".join(rows) + "\n]"
+
+
+def puzzleWriter(clues):
+    # This function writes a list of clues in a single line, in the list
+    # syntax, so it can be read back with clueReader.
+    return " ".join(clueWriter(clue) for clue in clues)
+
+
+def randomSolution(M, N, rng):
+    # This function returns a random solution: an M x N matrix of integers
+    # whose first row is 1, 2, ..., N and the others are random permutations.
+    rows = [np.arange(1, N + 1)]
+    rows += [rng.permutation(N) + 1 for _ in range(M - 1)]
+    return np.array(rows, dtype = np.int64)
+
+
+def candidateClues(solution):
+    # This function returns every clue that is true on a solution (as returned
+    # by randomSolution), positive and negative, for each pair of different
+    # categories.
+    #
+    M, N = solution.shape
+    clues = []
+    for a in range(M):
+        for b in range(a + 1, M):
+            for col in range(N):
+                i = int(solution[a,col])
+                for j in range(1, N + 1):
+                    positive = j == solution[b,col]
+                    clues.append(Clue(positive, a+1, i, b+1, j))
+    return clues
+
+
+def generatePuzzle(M, N, rng):
+    # This function generates a puzzle whose solution is determined by
+    # propagation alone, with a minimal set of clues (see the description of
+    # the module).
+    #
+    # INPUT:
+    #  - M, N: The numbers of categories and of options.
+    #  - rng: A NumPy random generator.
+    #
+    # OUTPUT:
+    #  - clues: A list of Clue objects, empty if M or N is 1, as then the
+    #           solution needs no clue.
+    #  - solution: The M x N matrix of the solution.
+    #
+    solution = randomSolution(M, N, rng)
+    candidates = candidateClues(solution)
+    order = rng.permutation(len(candidates))
+    table = compileClues(candidates)
+    pairs = np.ones((M, M, N, N), dtype = bool)
+    pairs[np.arange(M), np.arange(M)] = np.eye(N, dtype = bool)
+    kept, states = [], []
+    for k in order.tolist():
+        if _isDeduced(pairs, table[k]):
+            continue
+        states.append(pairs.copy())
+        kept.append(k)
+        _propagate(pairs, _applyClues(pairs, table[k:k+1]))
+        if _isDetermined(pairs):
+            break
+    if not kept:
+        return [], solution
+    needed = [kept[-1]]
+    for k, state in zip(kept[-2::-1], states[-2::-1]):
+        state = state.copy()
+        _propagate(state, _applyClues(state, table[needed]))
+        if not _isDetermined(state):
+            needed.append(k)
+    needed.reverse()
+    return [candidates[k] for k in needed], solution
+
+
+def generatePuzzles(M, N, count, workers = None, seed = None, chunksize = 4):
+    # This generator produces many puzzles with generatePuzzle, on a pool of
+    # processes. Each puzzle gets its own random generator, spawned from the
+    # seed, so the output does not depend on the number of workers.
+    #
+    # INPUT:
+    #  - M, N: The numbers of categories and of options.
+    #  - count: The number of puzzles.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - seed: OPTIONAL, the seed of the whole run.
+    #  - chunksize: OPTIONAL, the number of puzzles generated by each task.
+    #
+    # OUTPUT:
+    #  - Yields each puzzle as a line written by puzzleWriter.
+    #
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    tasks = ((M, N, seeds[k:k+chunksize]) for k in range(0, count, chunksize))
+    for lines in parallelMap(_generateChunk, tasks, workers):
+        yield from lines
+
+
+def main(argv = None):
+    # This is the command line entry point. It generates puzzles of each of
+    # the sizes given, as MxN, and writes how many were made per second and
+    # the mean number of clues.
+    #
+    parser = argparse.ArgumentParser(
+        description = "Generate Einstein puzzles with minimal sets of clues.")
+    parser.add_argument("sizes", nargs = "+",
+                        help = "sizes of the puzzles, as MxN (categories x "
+                               "options)")
+    parser.add_argument("-n", "--count", type = int, default = 100,
+                        help = "number of puzzles of each size")
+    parser.add_argument("-s", "--seed", type = int, default = None,
+                        help = "seed of the run")
+    parser.add_argument("-w", "--workers", type = int, default = None,
+                        help = "number of processes (default: all cores)")
+    parser.add_argument("-o", "--output", default = None,
+                        help = "file where the puzzles are written")
+    args = parser.parse_args(argv)
+    out = open(args.output, "w") if args.output is not None else None
+    try:
+        for size in args.sizes:
+            M, N = (int(x) for x in size.lower().split("x"))
+            start = time.time()
+            total = 0
+            for line in generatePuzzles(M, N, args.count, args.workers,
+                                        args.seed):
+                total += line.count("[") // 3
+                if out is not None:
+                    out.write(line + "\n")
+            elapsed = time.time() - start
+            print("%dx%d %.1f puzzles/s %.1f clues" %
+                  (M, N, args.count / elapsed, total / args.count),
+                  flush = True)
+    finally:
+        if out is not None:
+            out.close()
+
+
+###############
+###############
+##           ##
+##  PRIVATE  ##
+##           ##
+###############
+###############
+
+def _applyClues(pairs, table):
+    # Applies the compiled clues of table to the matrices of pairs (see the
+    # description of the module), keeping the matrices of (a,b) and (b,a) as
+    # the transpose of each other. The negative clues are applied all at once.
+    # Returns the list of the pairs of categories (a,b), with a < b, that the
+    # clues touch, or None if a clue relates two options of one category in
+    # a way that can not be.
+    a, i = table["category1"], table["option1"]
+    b, j = table["category2"], table["option2"]
+    same = a == b
+    if ((i[same] == j[same]) != table["positive"][same]).any():
+        return None
+    negative = ~table["positive"] & ~same
+    pairs[a[negative], b[negative], i[negative], j[negative]] = False
+    pairs[b[negative], a[negative], j[negative], i[negative]] = False
+    for k in np.flatnonzero(table["positive"] & ~same).tolist():
+        ak, ik, bk, jk = int(a[k]), int(i[k]), int(b[k]), int(j[k])
+        keep = pairs[ak,bk,ik,jk]
+        pairs[ak,bk,ik,:] = False
+        pairs[ak,bk,:,jk] = False
+        pairs[ak,bk,ik,jk] = keep
+        pairs[bk,ak] = pairs[ak,bk].T
+    touched = {(min(x, y), max(x, y)) for x, y in
+               zip(a[~same].tolist(), b[~same].tolist())}
+    return sorted(touched)
+
+
+def _isDeduced(pairs, record):
+    # Returns True if the compiled clue in record already follows from the
+    # matrices of pairs.
+    a, i = record["category1"], record["option1"]
+    b, j = record["category2"], record["option2"]
+    if record["positive"]:
+        return bool(pairs[a,b,i,j]) and pairs[a,b,i].sum() == 1
+    return not pairs[a,b,i,j]
+
+
+def _isDetermined(pairs):
+    # Returns True if every option of the first category has a single partner
+    # on each category, so the matrices of pairs give a single solution.
+    return bool((pairs[0].sum(axis = 2) == 1).all())
+
+
+def _generateChunk(task):
+    # Generates a puzzle for each seed of the task, on a worker of
+    # generatePuzzles, and returns them written by puzzleWriter.
+    M, N, seeds = task
+    return [puzzleWriter(generatePuzzle(M, N, np.random.default_rng(seed))[0])
+            for seed in seeds]
+
+
+def _singles(matrix):
+    # Applies the rule of the single partners to the matrix of a pair of
+    # categories, by rows and by columns, until nothing changes, and returns
+    # the new matrix, or None if an option is left without partners.
+    while True:
+        rows = matrix.sum(axis = 1)
+        columns = matrix.sum(axis = 0)
+        if not rows.all() or not columns.all():
+            return None
+        singles = matrix & (rows == 1)[:,None]
+        new = matrix & (singles | ~singles.any(axis = 0)[None,:])
+        singles = new & (columns == 1)[None,:]
+        new &= singles | ~singles.any(axis = 1)[:,None]
+        if np.array_equal(new, matrix):
+            return matrix
+        matrix = new
+
+
+def _propagate(pairs, queue):
+    # Reduces the matrices of pairs, in place, until nothing changes, starting
+    # from the pairs of categories (a,b), with a < b, on the queue. For each
+    # one, the rule of the single partners is applied to its matrix, and then
+    # the option i of a keeps the option k of any category c only if the
+    # product of the matrices of (a,b) and (b,c) has a positive entry (i,k),
+    # and the same from b. The pairs whose matrices change go to the queue.
+    # Returns False if an option is left without partners.
+    waiting = set(queue)
+    while queue:
+        a, b = queue.pop()
+        waiting.discard((a, b))
+        matrix = _singles(pairs[a,b])
+        if matrix is None:
+            return False
+        pairs[a,b] = matrix
+        pairs[b,a] = matrix.T
+        factor = matrix.astype(np.uint8)
+        for x, y, left in ((a, b, factor), (b, a, factor.T)):
+            through = np.matmul(left, pairs[y].astype(np.uint8)) > 0
+            new = pairs[x] & through
+            changed = (new != pairs[x]).any(axis = (1, 2))
+            for c in np.flatnonzero(changed).tolist():
+                if not new[c].any(axis = 1).all():
+                    return False
+                pairs[x,c] = new[c]
+                pairs[c,x] = new[c].T
+                key = (min(x, c), max(x, c))
+                if key not in waiting:
+                    waiting.add(key)
+                    queue.append(key)
+    return True
+
+
+def _search(pairs, limit, solutions, nodes):
+    # This is the backtracking part of the solver. When every option of the
+    # first category has a single partner on each category, that is a
+    # solution. Otherwise, the option of the first category with the fewest
+    # partners (more than one) on some category is tried with each of them,
+    # on a copy of the matrices, that is propagated before going deeper. The
+    # solutions are appended to solutions (as M x N matrices) until there are
+    # limit of them, and nodes is a list with a single integer, the number of
+    # partners tried.
+    M, N = pairs.shape[0], pairs.shape[2]
+    counts = pairs[0].sum(axis = 2)
+    if counts.max() == 1:
+        solution = pairs[0].argmax(axis = 2) + 1
+        solutions.append(solution.astype(np.int64))
+        return
+    counts[counts == 1] = N + 1
+    b, i = np.unravel_index(counts.argmin(), counts.shape)
+    for j in np.flatnonzero(pairs[0,b,i]).tolist():
+        nodes[0] += 1
+        new = pairs.copy()
+        new[0,b,i,:] = False
+        new[0,b,i,j] = True
+        new[b,0] = new[0,b].T
+        if _propagate(new, [(0, b)]):
+            _search(new, limit, solutions, nodes)
+            if len(solutions) >= limit:
+                return
+
 
 
 ###################
@@ -144,3 +554,213 @@
 ##              ##
 ##################
 ##################
+class Clue:
+    # This class contains a single clue: two options of two categories that are
+    # (positive clue) or are not (negative clue) in the same column. The
+    # categories and options are counted from 1, as in the list syntax.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    __slots__ = ("_positive", "_first", "_second")
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, positive, category1, option1, category2, option2):
+        # This is the creator of the class.
+        #
+        # INPUT:
+        #  - positive: True if the two options are in the same column, False
+        #              if they are not.
+        #  - category1, option1: The first option, and its category.
+        #  - category2, option2: The second option, and its category.
+        #
+        self._positive = bool(positive)
+        self._first = (category1, option1)
+        self._second = (category2, option2)
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def isPositive(self):
+        # Returns True for a positive clue, and False for a negative one.
+        return self._positive
+
+    def getFirst(self):
+        # Returns the pair (category, option) of the first option.
+        return self._first
+
+    def getSecond(self):
+        # Returns the pair (category, option) of the second option.
+        return self._second
+
+
+    ###########
+    # METHODS #
+    ###########
+    def __repr__(self):
+        return clueWriter(self)
+
+
+
+
+
+
+############################
+############################
+##                        ##
+##  CLASS EINSTEINPUZZLE  ##
+##                        ##
+############################
+############################
+class EinsteinPuzzle:
+    # This class contains a puzzle with M categories of N options each, its
+    # clues, and the logic necessary to solve it (see the description of the
+    # module). The solution is an M x N matrix, whose column j has the options
+    # that go with the option j+1 of the first category, so its first row is
+    # 1,2,...,N.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    __slots__ = ("_categories", "_options", "_clues", "_table", "_pairs",
+                 "_viable", "_solution", "_nodes")
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, categories, options, clues):
+        # This is the creator of the class. The clues are applied and
+        # propagated as soon as the puzzle is created.
+        #
+        # INPUT:
+        #  - categories: The number M of categories.
+        #  - options: The number N of options of each category.
+        #  - clues: Either a list of Clue objects, or a string with the clues
+        #           in the list syntax, as read by clueReader.
+        #
+        if isinstance(clues, str):
+            clues = clueReader(clues)
+        M, N = categories, options
+        self._categories = M
+        self._options = N
+        self._clues = list(clues)
+        self._table = compileClues(self._clues)
+        self._solution = None
+        self._nodes = 0
+        pairs = np.ones((M, M, N, N), dtype = bool)
+        pairs[np.arange(M), np.arange(M)] = np.eye(N, dtype = bool)
+        self._pairs = pairs
+        touched = _applyClues(pairs, self.getTable())
+        self._viable = touched is not None and _propagate(pairs, touched)
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getCategories(self):
+        # Returns the number of categories.
+        return self._categories
+
+    def getOptions(self):
+        # Returns the number of options of each category.
+        return self._options
+
+    def getClues(self):
+        # Returns the list of clues.
+        return self._clues
+
+    def getTable(self):
+        # Returns the clues compiled by compileClues.
+        return self._table[:len(self._clues)]
+
+    def getPairs(self):
+        # Returns the M x M x N x N array with the pairs of options that may
+        # still be in the same column.
+        return self._pairs
+
+    def getSolution(self):
+        # Returns the solution found by solve, or None.
+        return self._solution
+
+    def getNodes(self):
+        # Returns the number of partners tried by the last search.
+        return self._nodes
+
+    def isViable(self):
+        # Returns False if the puzzle has been found to have no solution.
+        return self._viable
+
+
+    ###########
+    # METHODS #
+    ###########
+    def addClue(self, clue):
+        # This method adds a clue to the puzzle, and propagates only from the
+        # pair of categories it touches. It returns whether the puzzle is still
+        # viable. The compiled table doubles its size when it is full, so
+        # adding the clues one at a time takes linear time.
+        #
+        k = len(self._clues)
+        if k == len(self._table):
+            table = np.zeros(max(2*k, 8), dtype = CLUE_DTYPE)
+            table[:k] = self._table
+            self._table = table
+        self._table[k:k+1] = compileClues([clue])
+        self._clues.append(clue)
+        record = self._table[k:k+1]
+        self._solution = None
+        if self._viable:
+            touched = _applyClues(self._pairs, record)
+            self._viable = touched is not None and \
+                           _propagate(self._pairs, touched)
+        return self._viable
+
+    def isSolved(self):
+        # Returns True if propagation alone determines the solution.
+        return self._viable and _isDetermined(self._pairs)
+
+    def solve(self):
+        # This method finds a solution of the puzzle, by propagation and, if
+        # needed, search. It returns True, and keeps the solution, if there is
+        # one.
+        #
+        solutions = self._solutions(1)
+        if not solutions:
+            return False
+        self._solution = solutions[0]
+        return True
+
+    def countSolutions(self, limit = 2):
+        # This method counts the solutions of the puzzle, stopping as soon as
+        # the count reaches the limit.
+        #
+        return len(self._solutions(limit))
+
+    def _solutions(self, limit):
+        # Returns a list with up to limit solutions, found by _search.
+        self._nodes = 0
+        if not self._viable:
+            return []
+        solutions = []
+        nodes = [0]
+        _search(self._pairs, limit, solutions, nodes)
+        self._nodes = nodes[0]
+        return solutions
+
+
+
+if __name__ == "__main__":
+    main()
+
+
+
+###############
+# END OF FILE #
+###############
@@ -33,10 +33,22 @@
 # IMPORTS #
 ###########
 import numpy as np
+import os
 import random
+import subprocess
+import tempfile
 import time
 import statistics
 
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                as_completed, wait)
+
+####################
+# GLOBAL VARIABLES #
+####################
+PAIRWISE = 6 # Largest group for which CNF.atMostOne is encoded by pairs.
+
 
 ###################
 ###################
@@ -59,138 +71,194 @@ def baseLatinSquare(n):
     #
     # OUTPUT:
     #  - latinSquare: A nxn NumPy matrix of integers containing the Latin Square
-    #                 generated by the function.
+    #                 generated by the function, with the symbols 1,2,...,n, in
+    #                 the smallest unsigned integer type that fits them.
     #
-    latinSquare = np.zeros((n,n),dtype = int)
-    for i in range(n):
-        for j in range(n):
-            latinSquare[i,j] = (i+j)%n + 1
-    return latinSquare
+    return cyclicLatinSquare(n) + _smallestType(n)(1)
+
+
+def cyclicLatinSquare(n, conjugates = False):
+    # This function builds the cyclic Latin Square of size n, where the cell
+    # (i,j) contains (i+j)%n, with broadcasting instead of loops. Optionally,
+    # it also returns the two conjugate representations used by the Jacobson
+    # and Matthews method.
+    #
+    # INPUT:
+    #  - n: integer, size of the Latin Square to be generated.
+    #  - conjugates: OPTIONAL, if True, the conjugates are also returned.
+    #
+    # OUTPUT:
+    #  - xy: A nxn NumPy matrix containing the Latin Square, with the symbols
+    #        0,1,...,n-1, in the smallest unsigned integer type that fits them.
+    #  - xz: Only if conjugates is True. The nxn matrix where xz[i,k] is the
+    #        column of the symbol k in the row i.
+    #  - yz: Only if conjugates is True. The nxn matrix where yz[j,k] is the
+    #        row of the symbol k in the column j.
+    #
+    dtype = _smallestType(n)
+    k = np.arange(n)
+    xy = ((k[:,None] + k) % n).astype(dtype)
+    if not conjugates:
+        return xy
+    xz = ((k - k[:,None]) % n).astype(dtype)
+    return xy, xz, xz.copy()
+
 
+def permuteLatinSquare(square, rows, columns, symbols):
+    # This function applies a permutation of the rows, one of the columns and
+    # one of the symbols to a Latin Square, in a single fancy indexing step.
+    # The result is a Latin Square isotopic to the original one.
+    #
+    # INPUT:
+    #  - square: A nxn NumPy matrix containing a Latin Square, with the symbols
+    #            0,1,...,n-1 or 1,2,...,n.
+    #  - rows: A permutation of 0,1,...,n-1. The row k of the result is the row
+    #          rows[k] of square.
+    #  - columns: A permutation of 0,1,...,n-1, used in the same way.
+    #  - symbols: A permutation of 0,1,...,n-1. The k-th symbol becomes the
+    #             symbols[k]-th one.
+    #
+    # OUTPUT:
+    #  - latinSquare: The permuted nxn matrix, with the same symbols and type
+    #                 as square.
+    #
+    base = square.min()
+    symbols = np.asarray(symbols, dtype = square.dtype) + base
+    return symbols[square[np.asarray(rows)[:,None], columns] - base]
 
-def randomLatinSquare(n):
+
+def randomIsotopicLatinSquare(n, rng = None):
+    # This function generates a random Latin Square by applying random
+    # permutations of the rows, the columns and the symbols to the cyclic
+    # square. It is very cheap even for large n, but it only reaches the
+    # squares isotopic to the cyclic one, so it is far from uniform.
+    #
+    # INPUT:
+    #  - n: integer, size of the Latin Square to be generated.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #
+    # OUTPUT:
+    #  - latinSquare: A nxn NumPy matrix containing the Latin Square, with the
+    #                 symbols 1,2,...,n, as in baseLatinSquare.
+    #
+    rng = np.random.default_rng(rng)
+    return permuteLatinSquare(baseLatinSquare(n), rng.permutation(n),
+                              rng.permutation(n), rng.permutation(n))
+
+
+def randomLatinSquare(n, rng = None, timeout = None):
     # This is a naive approach to generating random Latin Squares of a given
     # size. It is NOT based on the Jacobson and Matthews method. The approach
-    # is to generate permutations of the numbers from 1 to n, in such a way that
-    # the k-th element of the permuted row has not been used before.
+    # is to generate the square row by row, where each new row is a random
+    # perfect matching between the columns and the symbols not yet used on
+    # them. After k rows, each column misses n-k symbols and each symbol is
+    # missing from n-k columns, so by Hall's theorem such a matching always
+    # exists, and there is never the need to start again.
     #
     # INPUT:
     #  - n: integer, size of the Latin Square to be generated.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #  - timeout: OPTIONAL, the number of seconds after which the function
+    #             gives up and raises a TimeoutError.
     #
     # OUTPUT:
     #  - latinSquare: A nxn NumPy matrix of integers containing the Latin Square
     #                 generated by the function.
     #
-    # NOTE: Although this algorithm has been tested and has always worked, there
-    #       is no guarantee that it will always end. Also, the euristic complexity
-    #       of the algorithm seems to be O(n!/2^n). When tested, the generation
-    #       of a size 10 Latin Square, takes about 0.25 seconds in average.
-    #
-    remaining = [[ k+1 for k in range(n)] for i in range(n)]
-    latinSquare = np.zeros((n,n),dtype = int)
-    k = 0
-    while k < n:
-        j = 0
-        row = []
-        tried = [[] for i in range(n)]
-        while j < n and j > -1:
-            pick = [x for x in remaining[j] if x not in row]
-            if len(pick) > 0:
-                x = random.choice(pick)
-                tried[j].append(x)
-                row.append(x)
-                remaining[j].remove(x)
-                j += 1
-            else:
-                remaining[j] += tried[j]
-                tried[j] = []
-                if j > 0:
-                    row.pop()
-                j-=1
-        if len(row) == n:
-            latinSquare[k,:] = row
-            k += 1
-        else:
-            # This is the case of failure, tnat I am unsure if will be reached.
-            remaining = [[ k+1 for k in range(n)] for i in range(n)]
-            latinSquare = np.zeros((n,n),dtype = int)
-            k = 0
-            # print('Failure')
+    # NOTE: Each row is found with the augmenting paths of Kuhn's algorithm,
+    #       trying the columns and the symbols in random order, so the whole
+    #       square takes O(n^4) steps at most. The squares are random, but
+    #       not uniformly distributed, for that use randomLatinSquareJM.
+    #
+    rng = np.random.default_rng(rng)
+    deadline = None if timeout is None else time.time() + timeout
+    remaining = [list(range(1, n+1)) for j in range(n)]
+    latinSquare = np.zeros((n,n), dtype = int)
+    for k in range(n):
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError("randomLatinSquare ran out of time.")
+        options = [[remaining[j][x] for x in rng.permutation(n-k).tolist()]
+                   for j in range(n)]
+        owner = {}
+        for j in rng.permutation(n).tolist():
+            _augmentingPath(j, options, owner, set())
+        for x, j in owner.items():
+            latinSquare[k,j] = x
+            remaining[j].remove(x)
     return latinSquare
 
 
-def randomLatinSquareJM(n):
+def randomLatinSquareJM(n, rng = None, iterations = None):
     # This is an implementation of the Jacobson and Matthews method to generate
     # random Latin Square, based on the golang implementation of Paul Hankin.
     #
     # INPUT:
     #  - n: integer, size of the Latin Square to be generated.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one, so that
+    #         the results can be reproduced.
+    #  - iterations: OPTIONAL, the number of proper moves of the Markov chain.
+    #                By default n^2.
     #
     # OUTPUT:
-    #  - latinSquare: A nxn NumPy matrix of integers containing the Latin Square
-    #                 generated by the function.
+    #  - xy: A nxn NumPy matrix containing the Latin Square generated by the
+    #        function, with the symbols 0,1,...,n-1, in the smallest unsigned
+    #        integer type that fits them.
+    #  - xz: The conjugate nxn matrix, where xz[i,k] is the column of the
+    #        symbol k in the row i.
+    #  - yz: The conjugate nxn matrix, where yz[j,k] is the row of the symbol
+    #        k in the column j.
     #
-    # NOTE: The algorithm has been tested a few times. The time seems to be
-    #       above the predicted O(n^3), but still polynomial. For sizes over 10,
-    #       seems to be much faster than the naive approach.
-    #
-    t = time.time()
-    # Define the variables we need
-    xy = np.zeros((n,n),dtype = int) # frontal array
-    xz = np.zeros((n,n),dtype = int) # lateral array
-    yz = np.zeros((n,n),dtype = int) # upper array
-    minIter = n**3 # number of iterations to consider
-    proper = True # flag
-    C = 0 # counter
-    m = [0,0,0] # temporal container
-    mxy = mxz = myz = 0 # temporal variables
-
-    # Initialize the arrays.
-    for i in range(n):
-        for j in range(n):
-            k = (i+j)%n
-            xy[i,j] = k
-            xz[i,k] = j
-            yz[j,k] = i
+    # NOTE: The three arrays are kept as Python lists of rows during the
+    #       walk, which is much faster than indexing NumPy arrays one element
+    #       at a time, and the random numbers are drawn from the generator in
+    #       blocks. Each proper move takes about n improper steps on average,
+    #       and rewrites about n cells of the square.
+    #
+    # NOTE: The mixing time of the chain is not known. The n^3 proper moves
+    #       often quoted take O(n^4) steps, which is over half an hour for
+    #       n = 200. The default of n^2 proper moves takes O(n^3) steps, about
+    #       10 seconds for n = 200, and still rewrites every cell about n times
+    #       on average. Pass a larger number of iterations when the square has
+    #       to be closer to uniform, at the price of the running time.
+    #
+    rng = np.random.default_rng(rng)
+    if iterations is None:
+        iterations = n**2
+    xy, xz, yz = [a.tolist() for a in cyclicLatinSquare(n, True)]
+    _jacobsonMatthews(xy, xz, yz, n, iterations, rng)
+    dtype = _smallestType(n)
+    return (np.array(xy, dtype = dtype).reshape(n,n),
+            np.array(xz, dtype = dtype).reshape(n,n),
+            np.array(yz, dtype = dtype).reshape(n,n))
 
-    # Iteration of the method.
-    while C < minIter:
-        if proper:
-            i,j,k = [random.randrange(n) for a in range(3)]
-            while xy[i,j] == k:
-                i,j,k = [random.randrange(n) for a in range(3)]
-            ii = yz[j,k]
-            jj = xz[i,k]
-            kk = xy[i,j]
-            iii, jjj, kkk = i, j, k
-        else:
-            i,j,k = m
-            ii,iii = randomInversion(yz[j,k],myz)
-            jj,jjj = randomInversion(xz[i,k],mxz)
-            kk,kkk = randomInversion(xy[i,j],mxy)
-        proper = (xy[ii,jj] == kk)
-        if proper:
-            C += 1
-        else:
-            m = [ii,jj,kk]
-            mxy = xy[ii,jj]
-            mxz = xz[ii,kk]
-            myz = yz[jj,kk]
-        xy[i,j] = kkk
-        xy[i,jj] = kk
-        xy[ii,j] = kk
-        xy[ii,jj] = k
-        yz[j,k] = iii
-        yz[j,kk] = ii
-        yz[jj,k] = ii
-        yz[jj,kk] = i
-        xz[i,k] = jjj
-        xz[i,kk] = jj
-        xz[ii,k] = jj
-        xz[ii,kk] = j
-    print(time.time()-t)
-    return xy, xz, yz
 
+def randomLatinSquaresJM(n, count, rng = None, iterations = None):
+    # This function generates many random Latin Squares with the Jacobson and
+    # Matthews method. The walk is not restarted for each square: every square
+    # is obtained by running the Markov chain from the previous one, so the
+    # setup is paid only once.
+    #
+    # INPUT:
+    #  - n: integer, size of the Latin Squares to be generated.
+    #  - count: integer, number of Latin Squares to be generated.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #  - iterations: OPTIONAL, the number of proper moves between two squares.
+    #                By default n^2, see randomLatinSquareJM.
+    #
+    # OUTPUT:
+    #  - squares: A count x n x n NumPy array containing the Latin Squares,
+    #             with the symbols 0,1,...,n-1, as the matrix xy returned by
+    #             randomLatinSquareJM.
+    #
+    rng = np.random.default_rng(rng)
+    if iterations is None:
+        iterations = n**2
+    squares = np.empty((count,n,n), dtype = _smallestType(n))
+    xy, xz, yz = [a.tolist() for a in cyclicLatinSquare(n, True)]
+    for c in range(count):
+        _jacobsonMatthews(xy, xz, yz, n, iterations, rng)
+        squares[c] = xy
+    return squares
 
 
 def randomInversion(a,b):
@@ -203,13 +271,780 @@ def randomInversion(a,b):
         return b,a
 
 
+def completeLatinSquare(square, limit = 1):
+    # This function completes a partially filled Latin Square, seen as an exact
+    # cover problem. Each possible placement of a symbol k in the cell (i,j)
+    # covers the cell (i,j), the pair (row i, symbol k) and the pair (column j,
+    # symbol k).
+    #
+    # INPUT:
+    #  - square: A nxn NumPy matrix of integers, with the symbols 1,...,n in
+    #            the given cells and zeros in the empty ones.
+    #  - limit: OPTIONAL, the number of completions after which the search
+    #           stops. Using 2 tells if the completion is unique.
+    #
+    # OUTPUT:
+    #  - completions: A list with up to limit nxn NumPy matrices, each one a
+    #                 Latin Square that agrees with square on the given cells.
+    #
+    n = square.shape[0]
+    rows = []
+    for i in range(n):
+        for j in range(n):
+            for k in range(n):
+                rows.append([n*i + j, n*n + n*i + k, 2*n*n + n*j + k])
+    cover = ExactCover(3*n*n, rows)
+    for i, j in zip(*np.nonzero(square)):
+        if not cover.select((n*i + j)*n + square[i,j] - 1):
+            return []
+    completions = []
+    for solution in cover.solve(limit):
+        latinSquare = np.zeros((n,n), dtype = int)
+        for r in solution:
+            latinSquare[r // (n*n), (r // n) % n] = r % n + 1
+        completions.append(latinSquare)
+    return completions
+
+
+def parallelMap(function, tasks, workers = None, ordered = True, window = 4):
+    # This generator applies a function to each task on a pool of processes,
+    # and yields the results. The tasks are taken from the iterable only as
+    # the pool needs them (at most window tasks per worker are pending at any
+    # time), so they can come from a generator of any length.
+    #
+    # INPUT:
+    #  - function: A function defined at the top level of a module, so it can
+    #              be sent to the workers.
+    #  - tasks: An iterable with the argument of each call.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores. With a single worker, no pool is created at all.
+    #  - ordered: OPTIONAL, if True the results are yielded in the order of the
+    #             tasks, otherwise as they are completed.
+    #  - window: OPTIONAL, the number of pending tasks per worker.
+    #
+    # OUTPUT:
+    #  - Yields the result of function for each task.
+    #
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+    limit = window*workers
+    with ProcessPoolExecutor(workers) as pool:
+        if ordered:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(function, task))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for task in tasks:
+                pending.add(pool.submit(function, task))
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in as_completed(pending):
+                yield future.result()
+
+
+def dimacsReader(text):
+    # This function reads a formula in the DIMACS format.
+    #
+    # INPUT:
+    #  - text: A string with the contents of a DIMACS file.
+    #
+    # OUTPUT:
+    #  - cnf: A CNF object with the formula.
+    #
+    cnf = None
+    clause = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0] == "c":
+            continue
+        if fields[0] == "p":
+            cnf = CNF(int(fields[2]))
+            continue
+        for literal in map(int, fields):
+            if literal:
+                clause.append(literal)
+            else:
+                cnf.addClause(clause)
+                clause = []
+    return cnf
+
+
+def modelReader(text):
+    # This function reads the output of a SAT solver, in the format of the SAT
+    # competitions: a line "s SATISFIABLE" or "s UNSATISFIABLE", and the
+    # model in lines that start with "v". Returns the list of literals of the
+    # model, or None if the formula is unsatisfiable.
+    model = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "s":
+            if fields[1] != "SATISFIABLE":
+                if fields[1] == "UNSATISFIABLE":
+                    return None
+                raise RuntimeError("The SAT solver did not finish: " + line)
+        elif fields[0] == "v":
+            model.extend(int(l) for l in fields[1:] if l != "0")
+    return model
+
+
+def solveCNF(cnf, solver = None, timeout = None):
+    # This function finds a model of a formula, either with an external SAT
+    # solver or, if none is given, with dpll.
+    #
+    # INPUT:
+    #  - cnf: A CNF object.
+    #  - solver: OPTIONAL, the command of a SAT solver that takes the path of
+    #            a DIMACS file and writes its answer in the format of the SAT
+    #            competitions (such as kissat or cadical), either as a string
+    #            or as a list with its arguments.
+    #  - timeout: OPTIONAL, the number of seconds the solver is allowed to run.
+    #
+    # OUTPUT:
+    #  - model: The list of the literals that are true, or None if the formula
+    #           is unsatisfiable.
+    #
+    if solver is None:
+        return dpll(cnf.getClauses(), cnf.getVariables())
+    if isinstance(solver, str):
+        solver = solver.split()
+    handle, path = tempfile.mkstemp(suffix = ".cnf")
+    try:
+        with os.fdopen(handle, "w") as f:
+            f.write(cnf.toDimacs())
+        result = subprocess.run(solver + [path], capture_output = True,
+                                text = True, timeout = timeout)
+    finally:
+        os.remove(path)
+    return modelReader(result.stdout)
+
+
+def dpll(clauses, variables):
+    # This function decides a formula with the DPLL algorithm: the literals
+    # forced by unit clauses are propagated (keeping two watched literals per
+    # clause, so only the clauses that may have become unit are visited), and
+    # when nothing is forced the first unassigned variable, in order of the
+    # number of clauses it is in, is set to true, and then to false if that
+    # leads to a contradiction. It is deterministic.
+    #
+    # INPUT:
+    #  - clauses: A list of lists of literals.
+    #  - variables: The number of variables.
+    #
+    # OUTPUT:
+    #  - model: The list of the literals that are true, or None if the formula
+    #           is unsatisfiable.
+    #
+    # The value of each literal, and the clauses that watch it, are kept on
+    # lists of length 2*variables + 1, where the negative literals use the
+    # negative indices.
+    value = [0]*(2*variables + 1)
+    watches = [[] for l in range(2*variables + 1)]
+    occurrences = [0]*(variables + 1)
+    trail = []
+    for clause in clauses:
+        clause = list(dict.fromkeys(clause))
+        if any(-l in clause for l in clause):
+            continue
+        for l in clause:
+            occurrences[abs(l)] += 1
+        if not clause:
+            return None
+        if len(clause) == 1:
+            l = clause[0]
+            if value[l] < 0:
+                return None
+            if not value[l]:
+                value[l], value[-l] = 1, -1
+                trail.append(l)
+        else:
+            watches[clause[0]].append(clause)
+            watches[clause[1]].append(clause)
+    order = sorted(range(1, variables + 1), key = lambda v: -occurrences[v])
+    head = 0
+    position = 0
+    decisions = []
+    while True:
+        # Propagation of the literals on the trail.
+        conflict = False
+        while head < len(trail) and not conflict:
+            false = -trail[head]
+            head += 1
+            watching = watches[false]
+            keep = []
+            for k, clause in enumerate(watching):
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                other = clause[0]
+                if value[other] > 0:
+                    keep.append(clause)
+                    continue
+                for m in range(2, len(clause)):
+                    if value[clause[m]] >= 0:
+                        clause[1], clause[m] = clause[m], false
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    keep.append(clause)
+                    if value[other] < 0:
+                        keep.extend(watching[k+1:])
+                        conflict = True
+                        break
+                    value[other], value[-other] = 1, -1
+                    trail.append(other)
+            watches[false] = keep
+        # Backtracking on a conflict.
+        if conflict:
+            while decisions:
+                mark, literal, flipped, position = decisions.pop()
+                for l in trail[mark:]:
+                    value[l] = value[-l] = 0
+                del trail[mark:]
+                if not flipped:
+                    decisions.append((mark, -literal, True, position))
+                    value[-literal], value[literal] = 1, -1
+                    trail.append(-literal)
+                    break
+            else:
+                return None
+            head = mark
+            continue
+        # A new decision.
+        while position < variables and value[order[position]]:
+            position += 1
+        if position == variables:
+            return [v if value[v] > 0 else -v for v in range(1, variables + 1)]
+        v = order[position]
+        decisions.append((len(trail), v, False, position))
+        value[v], value[-v] = 1, -1
+        trail.append(v)
+
+
+###############
+###############
+##           ##
+##  PRIVATE  ##
+##           ##
+###############
+###############
+
+def _negate(literal):
+    # Returns the negation of a literal, that may also be a constant (True or
+    # False).
+    if isinstance(literal, bool):
+        return not literal
+    return -literal
+
+
+def _smallestType(n):
+    # Returns the smallest unsigned NumPy integer type that fits n.
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def _augmentingPath(j, options, owner, seen):
+    # Looks for an augmenting path from the column j in the bipartite graph
+    # between columns and symbols given by options, where owner maps each
+    # matched symbol to its column. Returns True if the matching was enlarged.
+    for x in options[j]:
+        if x not in seen:
+            seen.add(x)
+            if x not in owner or \
+               _augmentingPath(owner[x], options, owner, seen):
+                owner[x] = j
+                return True
+    return False
+
+
+def _jacobsonMatthews(xy, xz, yz, n, iterations, rng):
+    # Runs the Markov chain of Jacobson and Matthews on the lists of rows xy,
+    # xz and yz, until the given number of proper moves have been done. When
+    # the chain is on a proper square, a cell (i,j) and a symbol k different
+    # from xy[i][j] are chosen uniformly. Otherwise, the move starts from the
+    # improper cell m, and the two choices at each step are taken with
+    # probability 1/2.
+    if n < 2:
+        return
+    block = 3*min(4*iterations, 1 << 16)
+    buf = []
+    pos = 0
+    C = 0
+    proper = True
+    mi = mj = mk = mxy = mxz = myz = 0
+    while C < iterations:
+        if pos + 3 > len(buf):
+            buf = rng.random(block).tolist()
+            pos = 0
+        u, v, w = buf[pos], buf[pos+1], buf[pos+2]
+        pos += 3
+        if proper:
+            i = int(u*n)
+            j = int(v*n)
+            xyi, xzi, yzj = xy[i], xz[i], yz[j]
+            kk = xyi[j]
+            k = (kk + 1 + int(w*(n-1))) % n
+            ii = yzj[k]
+            jj = xzi[k]
+            iii, jjj, kkk = i, j, k
+        else:
+            i, j, k = mi, mj, mk
+            xyi, xzi, yzj = xy[i], xz[i], yz[j]
+            if u < 0.5:
+                ii, iii = yzj[k], myz
+            else:
+                ii, iii = myz, yzj[k]
+            if v < 0.5:
+                jj, jjj = xzi[k], mxz
+            else:
+                jj, jjj = mxz, xzi[k]
+            if w < 0.5:
+                kk, kkk = xyi[j], mxy
+            else:
+                kk, kkk = mxy, xyi[j]
+        xyii, xzii, yzjj = xy[ii], xz[ii], yz[jj]
+        proper = (xyii[jj] == kk)
+        if proper:
+            C += 1
+        else:
+            mi, mj, mk = ii, jj, kk
+            mxy = xyii[jj]
+            mxz = xzii[kk]
+            myz = yzjj[kk]
+        xyi[j] = kkk
+        xyi[jj] = kk
+        xyii[j] = kk
+        xyii[jj] = k
+        yzj[k] = iii
+        yzj[kk] = ii
+        yzjj[k] = ii
+        yzjj[kk] = i
+        xzi[k] = jjj
+        xzi[kk] = jj
+        xzii[k] = jj
+        xzii[kk] = j
+
+
+
+###################
+###################
+###################
+###             ###
+###             ###
+###   CLASSES   ###
+###             ###
+###             ###
+###################
+###################
+###################
+
+
+########################
+########################
+##                    ##
+##  CLASS EXACTCOVER  ##
+##                    ##
+########################
+########################
+class ExactCover:
+    # This class implements the Algorithm X of Donald Knuth, with the Dancing
+    # Links technique, to solve exact cover problems: given a family of rows,
+    # each one a subset of the columns 0,1,...,M-1, find subfamilies of rows
+    # that contain each column exactly once.
+    #
+    # The links are kept in flat lists, where the position 0 is the root, the
+    # positions 1,...,M are the column headers, and the rest are the nodes of
+    # the rows, in the order in which the rows were given.
+    #
+    # NOTE:
+    #  - Some rows may be selected beforehand (for example, the clues of a
+    #    puzzle) with the method select, before calling solve.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    _columns  = 0
+    _rows     = 0
+    _left     = None
+    _right    = None
+    _up       = None
+    _down     = None
+    _header   = None
+    _rowOf    = None
+    _rowStart = None
+    _count    = None
+    _selected = None
+    _nodes    = 0
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, columns, rows):
+        # This is the creator of the class.
+        #
+        # INPUT:
+        #  - columns: integer, the number M of columns to be covered.
+        #  - rows: A list of lists, each one containing the columns (integers
+        #          from 0 to M-1) of one row.
+        #
+        M = columns
+        L = list(range(-1, M))
+        R = list(range(1, M+2))
+        L[0] = M
+        R[M] = 0
+        U = list(range(M+1))
+        D = list(range(M+1))
+        C = list(range(M+1))
+        S = [0]*(M+1)
+        rowOf = [-1]*(M+1)
+        rowStart = []
+        for r, row in enumerate(rows):
+            first = len(C)
+            rowStart.append(first)
+            for col in row:
+                c = col + 1
+                x = len(C)
+                C.append(c)
+                rowOf.append(r)
+                U.append(U[c])
+                D.append(c)
+                D[U[c]] = x
+                U[c] = x
+                S[c] += 1
+                L.append(x-1)
+                R.append(x+1)
+            if len(C) > first:
+                L[first] = len(C) - 1
+                R[len(C) - 1] = first
+        self._columns = M
+        self._rows = len(rows)
+        self._left = L
+        self._right = R
+        self._up = U
+        self._down = D
+        self._header = C
+        self._rowOf = rowOf
+        self._rowStart = rowStart
+        self._count = S
+        self._selected = []
+        self._nodes = 0
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getColumns(self):
+        # Returns the number of columns of the problem.
+        return self._columns
+
+    def getRows(self):
+        # Returns the number of rows of the problem.
+        return self._rows
+
+    def getSelected(self):
+        # Returns the list of the rows selected beforehand.
+        return self._selected
+
+    def getNodes(self):
+        # Returns the number of rows tried by the last search.
+        return self._nodes
+
+
+    ###########
+    # METHODS #
+    ###########
+    def select(self, row):
+        # This method includes the given row in every solution, covering all of
+        # its columns. It returns False if one of those columns was already
+        # covered, in which case nothing is changed.
+        #
+        # INPUT:
+        #  - row: integer, the index of the row to be selected.
+        #
+        L, R, C = self._left, self._right, self._header
+        x = self._rowStart[row]
+        j = x
+        while True:
+            c = C[j]
+            if R[L[c]] != c:
+                return False
+            j = R[j]
+            if j == x:
+                break
+        while True:
+            self._cover(C[j])
+            j = R[j]
+            if j == x:
+                break
+        self._selected.append(row)
+        return True
+
+    def solve(self, limit = 1):
+        # This method searches for the solutions of the problem, choosing each
+        # time the column with the fewest rows left.
+        #
+        # INPUT:
+        #  - limit: OPTIONAL, the number of solutions after which the search
+        #           stops. Using 2 tells if the solution is unique.
+        #
+        # OUTPUT:
+        #  - solutions: A list with up to limit solutions, each one a list of
+        #               the indices of the rows used, including the ones
+        #               selected beforehand.
+        #
+        L, R, U, D, C, S = (self._left, self._right, self._up, self._down,
+                            self._header, self._count)
+        rowOf = self._rowOf
+        cover = self._cover
+        uncover = self._uncover
+        solutions = []
+        partial = []
+        nodes = [0]
+
+        def search():
+            if R[0] == 0:
+                solutions.append(self._selected + [rowOf[x] for x in partial])
+                return
+            c = R[0]
+            best = c
+            fewest = S[c]
+            while c and fewest > 1:
+                if S[c] < fewest:
+                    best = c
+                    fewest = S[c]
+                c = R[c]
+            if fewest == 0:
+                return
+            cover(best)
+            r = D[best]
+            while r != best:
+                nodes[0] += 1
+                partial.append(r)
+                j = R[r]
+                while j != r:
+                    cover(C[j])
+                    j = R[j]
+                search()
+                j = L[r]
+                while j != r:
+                    uncover(C[j])
+                    j = L[j]
+                partial.pop()
+                if len(solutions) >= limit:
+                    break
+                r = D[r]
+            uncover(best)
+
+        search()
+        self._nodes = nodes[0]
+        return solutions
+
+    def _cover(self, c):
+        # Removes the column c from the header list, and all the rows that
+        # contain it from the other columns.
+        L, R, U, D, C, S = (self._left, self._right, self._up, self._down,
+                            self._header, self._count)
+        L[R[c]] = L[c]
+        R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def _uncover(self, c):
+        # Undoes the method _cover, in the exact reverse order.
+        L, R, U, D, C, S = (self._left, self._right, self._up, self._down,
+                            self._header, self._count)
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c
+        R[L[c]] = c
+
+
+
+#################
+#################
+##             ##
+##  CLASS CNF  ##
+##             ##
+#################
+#################
+class CNF:
+    # This class contains a formula in conjunctive normal form, and the helpers
+    # to build the usual constraints on top of it. The methods that define a
+    # new literal as a function of others (the gates) accept, besides
+    # literals, the constants True and False, and simplify them away, returning
+    # a constant or an existing literal when there is no need for a new
+    # variable.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    __slots__ = ("_variables", "_clauses")
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, variables = 0):
+        # This is the creator of the class.
+        #
+        # INPUT:
+        #  - variables: OPTIONAL, the number of variables the formula starts
+        #               with. New ones are numbered after them.
+        #
+        self._variables = variables
+        self._clauses = []
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getVariables(self):
+        # Returns the number of variables.
+        return self._variables
+
+    def getClauses(self):
+        # Returns the list of clauses.
+        return self._clauses
+
+
+    ###########
+    # METHODS #
+    ###########
+    def newVariable(self):
+        # Adds a new variable, and returns it.
+        self._variables += 1
+        return self._variables
+
+    def addClause(self, literals):
+        # Adds the clause with the given literals. A clause with the constant
+        # True is left out, and the constants False are dropped from it.
+        clause = []
+        for l in literals:
+            if l is True:
+                return
+            if l is not False:
+                clause.append(l)
+        self._clauses.append(clause)
+
+    def atMostOne(self, literals):
+        # Adds the clauses that forbid two of the literals to be true: one for
+        # each pair on small groups, and a sequential (ladder) encoding, with
+        # an auxiliary variable for each literal but the last, on large ones.
+        if len(literals) <= PAIRWISE:
+            for k, a in enumerate(literals):
+                for b in literals[k+1:]:
+                    self.addClause([-a, -b])
+            return
+        previous = None
+        for l in literals[:-1]:
+            s = self.newVariable()
+            self.addClause([-l, s])
+            if previous is not None:
+                self.addClause([-previous, s])
+                self.addClause([-previous, -l])
+            previous = s
+        self.addClause([-previous, -literals[-1]])
 
+    def exactlyOne(self, literals):
+        # Adds the clauses that make exactly one of the literals true.
+        self.addClause(literals)
+        self.atMostOne(literals)
 
+    def exactly(self, literals, k):
+        # Adds the clauses that make exactly k of the literals true, with a
+        # sequential counter: after each literal, the j-th counter is true if
+        # and only if at least j of the literals so far are true. Only the
+        # counters up to k+1 are kept.
+        counts = [True] + [False]*(k+1)
+        for l in literals:
+            new = [True]
+            for j in range(1, k+2):
+                new.append(self._countGate(counts[j], counts[j-1], l))
+            counts = new
+        self.addClause([counts[k]])
+        self.addClause([_negate(counts[k+1])])
 
+    def orGate(self, literals):
+        # Returns a literal that is true if and only if one of the literals is.
+        inputs = []
+        for l in literals:
+            if l is True:
+                return True
+            if l is not False and l not in inputs:
+                inputs.append(l)
+        if not inputs:
+            return False
+        if len(inputs) == 1:
+            return inputs[0]
+        out = self.newVariable()
+        self.addClause([-out] + inputs)
+        for l in inputs:
+            self.addClause([-l, out])
+        return out
 
+    def andGate(self, literals):
+        # Returns a literal that is true if and only if all the literals are.
+        return _negate(self.orGate([_negate(l) for l in literals]))
 
+    def toDimacs(self):
+        # Returns the formula as a string in the DIMACS format.
+        lines = ["p cnf %d %d" % (self._variables, len(self._clauses))]
+        lines += [" ".join(map(str, clause + [0])) for clause in self._clauses]
+        return "\n".join(lines) + "\n"
 
+    def writeDimacs(self, path):
+        # Writes the formula in the DIMACS format to the file on path.
+        with open(path, "w") as f:
+            f.write(self.toDimacs())
 
+    def _countGate(self, before, below, literal):
+        # Returns a literal that is true if and only if before is, or both
+        # below and literal are: the j-th counter after a literal, given the
+        # j-th (before) and the (j-1)-th (below) counters before it.
+        if before is True or below is False or literal is False:
+            return before
+        if before is False:
+            return self.andGate([below, literal])
+        if below is True:
+            return self.orGate([before, literal])
+        if literal is True:
+            return self.orGate([before, below])
+        out = self.newVariable()
+        self.addClause([-before, out])
+        self.addClause([-below, -literal, out])
+        self.addClause([-out, before, below])
+        self.addClause([-out, before, literal])
+        return out
 
 
 
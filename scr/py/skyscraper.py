@@ -69,15 +69,28 @@
 # IMPORTS #
 ###########
 import copy
+import itertools
+import os
 
 import numpy as np
 
 from math import sqrt
 
+from puzzles import CNF, parallelMap, randomLatinSquareJM, solveCNF
+
 ####################
 # GLOBAL VARIABLES #
 ####################
 BACKTRACKING = "BACKTRACKING"
+SAT = "SAT"
+
+MAX_TABLE = 9 # Largest size for which the tables of permutations are used.
+
+_SUBSETS = {} # Sizes and highest bits of the subsets of heights, indexed by N.
+_TABLES = {} # Permutations sorted by their clues, indexed by N.
+_LINES = {} # Permutations already selected, indexed by (N, first, last).
+_BITS = {} # The same permutations, with each height h as the bit h-1.
+_POPCOUNT = np.array([bin(b).count("1") for b in range(256)], dtype = np.uint8)
 # Exampls of finished boards
 # board1 = np.array([[4,5,1,3,2],[5,4,3,2,1],[1,3,2,4,5],[2,1,4,5,3],[3,2,5,1,4]],dtype=int)
 # board2 = np.array([[1,2,4,3,5],[2,3,5,4,1],[4,1,3,5,2],[5,4,2,1,3],[3,5,1,2,4]],dtype=int)
@@ -107,37 +120,217 @@ def generateLURD(board):
     # OUTPUT:
     #  - lurd: A 4 x n NumPy array containint the clues to recreate the board.
     #
-    n = board.shape[0]
-    lurd = np.zeros((4,n),dtype = int)
-    for j in range(n):
-        cur_max_x = 0
-        cur_max_y = 0
-        count_x = 0
-        count_y = 0
-        for k in range(n):
-            if board[j,k] > cur_max_x:
-                cur_max_x = board[j,k]
-                count_x += 1
-            if board[k,j] > cur_max_y:
-                cur_max_y = board[k,j]
-                count_y += 1
-        lurd[0,j] = count_x
-        lurd[1,j] = count_y
-    for j in range(n):
-        cur_max_x = 0
-        cur_max_y = 0
-        count_x = 0
-        count_y = 0
-        for k in range(n):
-            if board[j,n-1-k] > cur_max_x:
-                cur_max_x = board[j,n-1-k]
-                count_x += 1
-            if board[n-1-k,j] > cur_max_y:
-                cur_max_y = board[n-1-k,j]
-                count_y += 1
-        lurd[2,j] = count_x
-        lurd[3,j] = count_y
-    return lurd
+    return generateLURDs(np.asarray(board)[None,:,:])[0]
+
+
+def generateLURDs(boards):
+    # This method does the same as generateLURD for a whole stack of boards at
+    # once, without loops over the cells. Looking along one direction, a cell
+    # is visible if it is taller than the running maximum of the cells before
+    # it, which is obtained with np.maximum.accumulate.
+    #
+    # INPUT:
+    #  - boards: A B x n x n NumPy array containing B Latin Squares.
+    #
+    # OUTPUT:
+    #  - lurds: A B x 4 x n NumPy array containing the clues of each board.
+    #
+    B, n = boards.shape[0], boards.shape[1]
+    lurds = np.empty((B,4,n), dtype = int)
+    for side, view, axis in ((0, boards, 2),
+                             (1, boards, 1),
+                             (2, boards[:,:,::-1], 2),
+                             (3, boards[:,::-1,:], 1)):
+        before = np.maximum.accumulate(view, axis = axis)
+        if axis == 2:
+            before = np.concatenate([np.zeros_like(before[:,:,:1]),
+                                     before[:,:,:-1]], axis = 2)
+        else:
+            before = np.concatenate([np.zeros_like(before[:,:1,:]),
+                                     before[:,:-1,:]], axis = 1)
+        lurds[:,side,:] = (view > before).sum(axis = axis)
+    return lurds
+
+
+def linePermutations(N, first, last, cacheDir = None):
+    # This function returns all the orderings of the heights 1,2,...,N on a
+    # line that agree with the pair of clues seen from its two ends. The table
+    # of all the permutations of size N, sorted by their pair of clues, is
+    # built the first time it is needed, and kept for the rest of the
+    # process. It may also be kept on disk, so it is built only once.
+    #
+    # INPUT:
+    #  - N: integer, the size of the line.
+    #  - first: integer, the clue seen from the first (left or upper) end, or
+    #           0 if there is no clue.
+    #  - last: integer, the clue seen from the last (right or lower) end, or 0
+    #          if there is no clue.
+    #  - cacheDir: OPTIONAL, a directory where the table is saved, and loaded
+    #              from in later runs.
+    #
+    # OUTPUT:
+    #  - perms: A K x N NumPy array of uint8, where each row is one of the K
+    #           orderings. It is shared, so it should not be modified.
+    #
+    key = (N, first, last)
+    if key not in _LINES:
+        perms, offsets = _permutationTable(N, cacheDir)
+        firsts = [first] if first else range(1, N+1)
+        lasts = [last] if last else range(1, N+1)
+        blocks = [perms[offsets[f*(N+1) + l]:offsets[f*(N+1) + l + 1]]
+                  for f in firsts for l in lasts]
+        _LINES[key] = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+    return _LINES[key]
+
+
+def lurdWriter(lurd):
+    # This function writes the clues of a puzzle as a single line, with the
+    # digits of the Left, Up, Right and Down clues one after the other, and 0
+    # for the missing clues. It works for sizes up to 9.
+    #
+    # INPUT:
+    #  - lurd: A 4 x n NumPy array with the clues.
+    #
+    # OUTPUT:
+    #  - line: A string of length 4n.
+    #
+    return "".join(str(c) for c in lurd.ravel().tolist())
+
+
+def lurdReader(line):
+    # This function does the opposite of lurdWriter.
+    #
+    # INPUT:
+    #  - line: A string of length 4n, with one digit per clue.
+    #
+    # OUTPUT:
+    #  - lurd: A 4 x n NumPy array with the clues, and 0 for the missing ones.
+    #
+    line = line.strip()
+    return np.array([int(c) for c in line], dtype = int).reshape(4,-1)
+
+
+def generatePuzzle(N, rng = None):
+    # This function generates a puzzle with a unique solution and few clues.
+    # It samples random Latin Squares until the full set of clues has a
+    # unique solution (which is not always the case), and then goes through
+    # the clues in a random order, removing each one (setting it to 0) as long
+    # as the solution remains unique. The result is minimal: no clue can be
+    # removed without losing the uniqueness.
+    #
+    # INPUT:
+    #  - N: integer, the size of the puzzle.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #
+    # OUTPUT:
+    #  - lurd: A 4 x N NumPy array with the clues, and 0 for the removed ones.
+    #  - board: The N x N NumPy array with the solution.
+    #
+    rng = np.random.default_rng(rng)
+    while True:
+        board = randomLatinSquareJM(N, rng)[0].astype(int) + 1
+        lurd = generateLURD(board)
+        if SkyScraperPuzzle(lurd).countSolutions(2) == 1:
+            break
+    for k in rng.permutation(4*N).tolist():
+        side, j = divmod(k, N)
+        clue = lurd[side,j]
+        lurd[side,j] = 0
+        if SkyScraperPuzzle(lurd).countSolutions(2) != 1:
+            lurd[side,j] = clue
+    return lurd, board
+
+
+def generatePuzzles(N, count, workers = None, seed = None, chunksize = 4):
+    # This generator produces many puzzles with generatePuzzle, on a pool of
+    # processes. Each puzzle gets its own random generator, spawned from the
+    # seed, so the output does not depend on the number of workers.
+    #
+    # INPUT:
+    #  - N: integer, the size of the puzzles.
+    #  - count: The number of puzzles.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - seed: OPTIONAL, the seed of the whole run.
+    #  - chunksize: OPTIONAL, the number of puzzles generated by each task.
+    #
+    # OUTPUT:
+    #  - Yields each puzzle as a line written by lurdWriter.
+    #
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    tasks = ((N, seeds[k:k+chunksize]) for k in range(0, count, chunksize))
+    for lines in parallelMap(_generateChunk, tasks, workers):
+        yield from lines
+
+
+def skyscraperCNF(lurd, board = None):
+    # This function encodes a puzzle as a CNF formula, to be solved with
+    # puzzles.solveCNF or written for an external SAT solver. The variable
+    # N*(N*i + j) + h stands for the cell (i,j) having the height h, so the
+    # first N^3 variables are the board. For each end of a line with a clue,
+    # auxiliary variables tell if the tallest of the first k cells is at least
+    # h (the one for k-1, the one for h+1, or the cell itself), and which cells
+    # are visible: a cell with height h is visible if and only if none of the
+    # cells before it reaches h+1. The visible cells are then counted with a
+    # sequential counter that has to end on the clue.
+    #
+    # INPUT:
+    #  - lurd: A 4 x N NumPy array with the clues, and 0 for the missing ones.
+    #  - board: OPTIONAL, an N x N NumPy array with the heights already known,
+    #           and 0 on the empty cells.
+    #
+    # OUTPUT:
+    #  - cnf: A puzzles.CNF object with the formula.
+    #
+    N = lurd.shape[1]
+    x = lambda i, j, h: N*(N*i + j) + h
+    cnf = CNF(N**3)
+    heights = range(1, N+1)
+    for i in range(N):
+        for j in range(N):
+            cnf.exactlyOne([x(i,j,h) for h in heights])
+        for h in heights:
+            cnf.exactlyOne([x(i,j,h) for j in range(N)])
+            cnf.exactlyOne([x(j,i,h) for j in range(N)])
+    for side in range(4):
+        for k in range(N):
+            clue = int(lurd[side,k])
+            if not clue:
+                continue
+            cells = [(k, j) if side % 2 == 0 else (j, k) for j in range(N)]
+            if side >= 2:
+                cells.reverse()
+            reach = [False]*(N+2)
+            visible = []
+            for i, j in cells:
+                seen = cnf.newVariable()
+                for h in heights:
+                    cnf.addClause([-x(i,j,h), reach[h+1], seen])
+                    if reach[h+1] is not False:
+                        cnf.addClause([-x(i,j,h), -reach[h+1], -seen])
+                visible.append(seen)
+                new = [False]*(N+2)
+                for h in reversed(heights):
+                    new[h] = cnf.orGate([reach[h], new[h+1], x(i,j,h)])
+                reach = new
+            cnf.exactly(visible, clue)
+    if board is not None:
+        for (i, j), h in np.ndenumerate(board):
+            if h:
+                cnf.addClause([x(i,j,int(h))])
+    return cnf
+
+
+def skyscraperBoard(model, N):
+    # Returns the N x N board given by a model of the formula of
+    # skyscraperCNF.
+    board = np.zeros((N,N), dtype = np.uint8)
+    for literal in model:
+        if 0 < literal <= N**3:
+            c, h = divmod(literal - 1, N)
+            board[c // N, c % N] = h + 1
+    return board
+
 
 ###############
 ###############
@@ -147,6 +340,358 @@ def generateLURD(board):
 ###############
 ###############
 
+def _generateChunk(task):
+    # Generates the puzzles of one task of generatePuzzles, and returns them as
+    # lines.
+    N, seeds = task
+    return [lurdWriter(generatePuzzle(N, np.random.default_rng(seed))[0])
+            for seed in seeds]
+
+
+def _maskType(N):
+    # Returns the smallest unsigned integer type with a bit for each height.
+    return np.uint16 if N <= 16 else np.uint32
+
+
+def _popcount(masks):
+    # Returns the number of bits set on each element of an array of masks.
+    masks = np.ascontiguousarray(masks)
+    parts = masks.view(np.uint8).reshape(masks.shape + (masks.itemsize,))
+    return _POPCOUNT[parts].sum(axis = -1, dtype = np.int64)
+
+
+def _cluePruning(options, lurd):
+    # Removes from the options (a bitmask of heights per cell) the heights
+    # that the clues rule out on their own. Seen from an end with clue c, the
+    # cell at distance d from the edge can not be higher than N-c+1+d, as at
+    # least c-1 skyscrapers, lower than it, have to be visible before it. A
+    # clue of 1 places N at the edge, and a clue of N forces the sequence
+    # 1,2,...,N. Every rule only takes options away, so what the board and
+    # the other clues have already ruled out stays out.
+    N = options.shape[0]
+    for k in range(N):
+        ends = [(lurd[0,k], options[k,:]),        # Left.
+                (lurd[1,k], options[:,k]),        # Up.
+                (lurd[2,k], options[k,::-1]),     # Right.
+                (lurd[3,k], options[::-1,k])]     # Down.
+        for c, line in ends:
+            if c == 1:
+                line[0] &= 1 << (N-1)
+            elif c == N:
+                line &= (1 << np.arange(N)).astype(options.dtype)
+            elif c > 1:
+                for d in range(c-1):
+                    line[d] &= (1 << (N-c+1+d)) - 1
+
+
+def _latinPropagation(options):
+    # Applies the rules of the Latin Square to the options (a bitmask of
+    # heights per cell): a height that is the only option of a cell is removed
+    # from the rest of its row and its column, and a height that has a single
+    # place left in a row or in a column is fixed there. The heights that
+    # appear once and more than once on each line are found by going through
+    # its cells with two masks. Returns False if a contradiction is found.
+    N = options.shape[0]
+    full = (1 << N) - 1
+    while True:
+        if not options.all():
+            return False
+        single = (options & (options - 1)) == 0
+        singles = np.where(single, options, 0)
+        rowHas = np.bitwise_or.reduce(singles, axis = 1)
+        colHas = np.bitwise_or.reduce(singles, axis = 0)
+        if (rowHas != singles.sum(axis = 1)).any() or \
+           (colHas != singles.sum(axis = 0)).any():
+            return False
+        new = np.where(single, options, options & ~(rowHas[:,None] |
+                                                    colHas[None,:]))
+        for lines in (new, new.T):
+            once = np.zeros(N, dtype = options.dtype)
+            twice = np.zeros(N, dtype = options.dtype)
+            for k in range(N):
+                twice |= once & lines[:,k]
+                once |= lines[:,k]
+            if (once != full).any():
+                return False
+            hidden = lines & (once & ~twice)[:,None]
+            if (hidden & (hidden - 1)).any():
+                return False
+            lines[...] = np.where(hidden != 0, hidden, lines)
+        if np.array_equal(new, options):
+            return True
+        options[...] = new
+
+
+def _lineSupport(masks, first, last, N):
+    # Finds, for each cell of a line, the heights (as a bitmask) that appear on
+    # some ordering of the line that agrees with the options (given as one
+    # bitmask per cell) and with the clues seen from both ends (a clue of 0
+    # means no clue). Returns None if there is no such ordering.
+    #
+    # The tallest skyscraper, N, splits the line in two parts that do not see
+    # each other: the cells before it are only seen from the first end, and
+    # the ones after it only from the last end. So, for each set S of heights
+    # lower than N, F[S] is the bitmask of the numbers of skyscrapers that can
+    # be seen from the first end when S fills the first |S| cells, and B[S]
+    # the same from the last end. The line is then a valid split, S before N
+    # and the rest after it, and the heights that can be on each cell are
+    # found by going back through the sets that lead to valid splits.
+    #
+    top = 1 << (N-1)
+    lower = top - 1
+    sizes, highest = _subsets(N)
+    reverse = masks[::-1]
+    F = _visibleCounts(masks, sizes, highest, lower)
+    B = _visibleCounts(reverse, sizes, highest, lower)
+    needF = 1 << (first-1) if first else -1
+    needB = 1 << (last-1) if last else -1
+    GF = [0]*(top)
+    GB = [0]*(top)
+    support = [0]*N
+    for S in range(top):
+        T = lower ^ S
+        if masks[sizes[S]] & top and F[S] & needF and B[T] & needB:
+            GF[S] |= F[S] & needF
+            GB[T] |= B[T] & needB
+            support[sizes[S]] |= top
+    if not any(support):
+        return None
+    left = _goBack(masks, F, GF, sizes, highest)
+    right = _goBack(reverse, B, GB, sizes, highest)
+    for d in range(N):
+        support[d] |= left[d] | right[N-1-d]
+    return support
+
+
+def _visibleCounts(masks, sizes, highest, lower):
+    # Returns the list F of _lineSupport, with the cells in the given order.
+    F = [0]*(lower+1)
+    F[0] = 1
+    for S in range(1, lower+1):
+        allowed = masks[sizes[S]-1] & S
+        counts = 0
+        while allowed:
+            b = allowed & -allowed
+            allowed ^= b
+            if b == highest[S]:
+                counts |= F[S ^ b] << 1
+            else:
+                counts |= F[S ^ b]
+        F[S] = counts
+    return F
+
+
+def _goBack(masks, F, G, sizes, highest):
+    # Goes back from the valid splits of _lineSupport through the sets that
+    # lead to them. G starts with the numbers of visible skyscrapers that are
+    # good for each set, and the heights used on the way are returned, as one
+    # bitmask per cell, with the cells in the given order.
+    support = [0]*len(masks)
+    for S in range(len(G)-1, 0, -1):
+        good = G[S]
+        if not good:
+            continue
+        d = sizes[S] - 1
+        allowed = masks[d] & S
+        while allowed:
+            b = allowed & -allowed
+            allowed ^= b
+            if b == highest[S]:
+                counts = F[S ^ b] & (good >> 1)
+            else:
+                counts = F[S ^ b] & good
+            if counts:
+                G[S ^ b] |= counts
+                support[d] |= b
+    return support
+
+
+def _subsets(N):
+    # Returns (and caches) the size and the highest bit of each subset of the
+    # heights lower than N.
+    if N not in _SUBSETS:
+        top = 1 << (N-1)
+        sizes = [bin(S).count("1") for S in range(top)]
+        highest = [1 << (S.bit_length()-1) if S else 0 for S in range(top)]
+        _SUBSETS[N] = (sizes, highest)
+    return _SUBSETS[N]
+
+
+def _linePropagation(options, lurd, done):
+    # Reduces the options of each row and column to the heights that appear on
+    # some ordering of the line that agrees with its clues. For sizes up to
+    # MAX_TABLE, the orderings of each line are taken from linePermutations
+    # and filtered with the options, and otherwise they are gone through with
+    # _lineSupport. The dictionary done keeps, for each line, its masks when
+    # it was last reduced (and the orderings that were left), so lines are not
+    # gone through again while they do not change, and the orderings are
+    # filtered further down the search. Returns None if a line has no valid
+    # ordering, and otherwise whether the options changed.
+    N = options.shape[0]
+    L, U, R, D = lurd.tolist()
+    masks = options.astype(np.int64)
+    new = masks.copy()
+    for k in range(N):
+        for key, line, first, last in ((("R",k), masks[k,:], L[k], R[k]),
+                                       (("C",k), masks[:,k], U[k], D[k])):
+            if not first and not last:
+                continue
+            previous = done.get(key)
+            lineMasks = line.tolist()
+            if previous is not None and previous[0] == lineMasks:
+                continue
+            if N <= MAX_TABLE:
+                bits = _lineBits(N, first, last) if previous is None \
+                       else previous[1]
+                bits = bits[(bits & line.astype(np.uint16)).all(axis = 1)]
+                if not len(bits):
+                    return None
+                support = np.bitwise_or.reduce(bits, axis = 0)
+            else:
+                bits = None
+                support = _lineSupport(lineMasks, first, last, N)
+                if support is None:
+                    return None
+            if key[0] == "R":
+                new[k,:] &= support
+                done[key] = (new[k,:].tolist(), bits)
+            else:
+                new[:,k] &= support
+                done[key] = (new[:,k].tolist(), bits)
+    if np.array_equal(new, masks):
+        return False
+    options[...] = new
+    return True
+
+
+def _permutationTable(N, cacheDir = None):
+    # Returns (and caches) the array of all the permutations of 1,2,...,N,
+    # sorted by the pair of clues (first, last) they produce, and the array of
+    # offsets where the permutations with clues (f,l) start, at f*(N+1)+l.
+    if N not in _TABLES:
+        path = None
+        if cacheDir is not None:
+            path = os.path.join(cacheDir, "skyscraper%d.npz" % N)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    _TABLES[N] = (data["perms"], data["offsets"])
+                return _TABLES[N]
+        perms = np.array(list(itertools.permutations(range(1, N+1))),
+                         dtype = np.uint8).reshape(-1, N)
+        first = (perms == np.maximum.accumulate(perms, axis = 1)).sum(axis = 1)
+        back = perms[:,::-1]
+        last = (back == np.maximum.accumulate(back, axis = 1)).sum(axis = 1)
+        keys = first*(N+1) + last
+        order = np.argsort(keys, kind = "stable")
+        perms = perms[order]
+        offsets = np.searchsorted(keys[order], np.arange((N+1)**2 + 1))
+        _TABLES[N] = (perms, offsets)
+        if path is not None:
+            np.savez(path, perms = perms, offsets = offsets)
+    return _TABLES[N]
+
+
+def _lineBits(N, first, last):
+    # Returns (and caches) the permutations of linePermutations, with each
+    # height h replaced by the bit h-1, so they can be checked against masks.
+    key = (N, first, last)
+    if key not in _BITS:
+        perms = linePermutations(N, first, last).astype(np.uint16)
+        _BITS[key] = np.uint16(1) << (perms - 1)
+    return _BITS[key]
+
+
+def _visibilityBounds(line, N):
+    # Returns the lower and upper bounds of the number of skyscrapers that can
+    # be seen on a partially filled line (zeros on the empty cells), looking
+    # from its first cell. A filled cell is surely seen if it is taller than
+    # every cell before it, including whatever may go in the empty ones (the
+    # heights not used yet on the line), and it may be seen if it is taller
+    # than the filled cells before it. An empty cell may be seen if some
+    # unused height is taller than the filled cells before it, and the first
+    # cell is always seen. A repeated height makes the line impossible, which
+    # is returned as the bounds (N+1, 0).
+    used = 0
+    for h in line:
+        if h:
+            b = 1 << (h-1)
+            if used & b:
+                return (N+1, 0)
+            used |= b
+    tallest = (((1 << N) - 1) & ~used).bit_length()
+    lower = upper = 0
+    top = 0
+    gap = False
+    for h in line:
+        if h:
+            if h > top:
+                upper += 1
+                if not gap or h > tallest:
+                    lower += 1
+                top = h
+        else:
+            if not gap and not top:
+                lower += 1
+            if tallest > top:
+                upper += 1
+            gap = True
+    return (lower, upper)
+
+
+def _maskHeights(options):
+    # Returns the uint8 board with the height of each cell whose options have
+    # a single bit.
+    return np.frexp(options.astype(np.float64))[1].astype(np.uint8)
+
+
+def _heightMasks(board, N):
+    # Returns the options of a board: the bit of its height on the filled
+    # cells, and every height on the empty ones.
+    board = np.asarray(board).astype(np.int64)
+    return np.where(board > 0, 1 << np.maximum(board - 1, 0),
+                    (1 << N) - 1).astype(_maskType(N))
+
+
+def _propagate(options, lurd, done):
+    # Alternates the propagation of the Latin Square rules and the one of the
+    # clues of each line, until nothing changes. Returns False if a
+    # contradiction is found.
+    while True:
+        if not _latinPropagation(options):
+            return False
+        changed = _linePropagation(options, lurd, done)
+        if changed is None:
+            return False
+        if not changed:
+            return True
+
+
+def _search(options, lurd, done, limit, solutions, nodes):
+    # This is the backtracking part of the solver. The cell with the fewest
+    # options left is chosen, and each of its heights is tried on a copy of
+    # the options (only N x N masks), which is propagated before going deeper.
+    # The solutions are appended to solutions, until there are limit of them,
+    # and nodes is a list with a single integer, the number of heights tried.
+    counts = _popcount(options)
+    if counts.max() == 1:
+        solutions.append(_maskHeights(options))
+        return
+    counts[counts == 1] = options.shape[0] + 1
+    i, j = np.unravel_index(counts.argmin(), counts.shape)
+    mask = int(options[i,j])
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        nodes[0] += 1
+        new = options.copy()
+        new[i,j] = bit
+        newDone = dict(done)
+        if _propagate(new, lurd, newDone):
+            _search(new, lurd, newDone, limit, solutions, nodes)
+            if len(solutions) >= limit:
+                return
+
+
 
 ###################
 ###################
@@ -181,16 +726,17 @@ class SkyScraperPuzzle:
     ##############
     # ATTRIBUTES #
     ##############
-    _size    = 0
-    _lurd    = []
-    _board   = []
-    _options = []
+    # The options are kept as an N x N array of bitmasks (the bit h-1 for the
+    # height h), and the board as an N x N uint8 array, so a state takes a few
+    # bytes per cell, and many of them can be kept alive at once.
+    __slots__ = ("_size", "_lurd", "_board", "_options", "_nodes", "_bounds",
+                 "_violations", "_history")
 
 
     ############
     # CREATORS #
     ############
-    def __init__(self,lurd, board = np.zeros((1,2),dtype = int)):
+    def __init__(self,lurd, board = None):
         # This is the creator of the class. It takes one mandatory argument,
         # LURD (Left, Up, Right, Down) that contains the clues, and an optional
         # board, that should contain the actual board of the solution, maybe
@@ -206,7 +752,7 @@ class SkyScraperPuzzle:
         #           array, with N the size of the puzzle. This array should
         #           contain either a valid solution for lurd, a zero matrix, or
         #           a partially filled board of a valid solution, with zeros in
-        #           the unfilled position.
+        #           the unfilled position. It is copied.
         #
         # NOTE:
         #  - Consider adding a verification step for the board.
@@ -214,12 +760,31 @@ class SkyScraperPuzzle:
         N = lurd.shape[1]
         self._size = N
         self._lurd  = lurd
-        self._options = np.ones((N,N,N), dtype = int)
-        if board.shape[0] == board.shape[1] == N:
-            self._board = board
-            # There should be a better initialization of the of the option array
+        self._options = np.full((N,N), (1 << N) - 1, dtype = _maskType(N))
+        self._nodes = 0
+        if board is not None and np.shape(board) == (N,N):
+            self._board = np.array(board, dtype = np.uint8)
         else:
-            self._board = np.zeros((N,N), dtype = int)
+            self._board = np.zeros((N,N), dtype = np.uint8)
+        self._resetBounds()
+
+    def copy(self):
+        # Returns a copy of the puzzle, that can be modified (placing heights,
+        # or changing the options) without affecting this one. The clues are
+        # shared, and the bounds and the history of placeHeight are copied,
+        # so removeHeight works on the copy too.
+        other = SkyScraperPuzzle.__new__(SkyScraperPuzzle)
+        other._size = self._size
+        other._lurd = self._lurd
+        other._board = self._board.copy()
+        other._options = self._options.copy()
+        other._nodes = self._nodes
+        other._bounds = list(self._bounds)
+        other._violations = self._violations
+        other._history = list(self._history)
+        return other
+
+    __copy__ = copy
 
 
     ###########
@@ -238,9 +803,14 @@ class SkyScraperPuzzle:
         return self._board
 
     def getOptions(self):
-        # Returns the 3D array with all the options given.
+        # Returns the N x N array with the options of each cell, as a bitmask
+        # where the bit h-1 stands for the height h.
         return self._options
 
+    def getNodes(self):
+        # Returns the number of heights tried by the last search.
+        return self._nodes
+
 
     ###########
     # SETTERS #
@@ -254,16 +824,24 @@ class SkyScraperPuzzle:
         # Sets the clues (lurd) to the array
         # Is it necessary to have a way to modify lurd?
         self._lurd = lurd
+        self._resetBounds()
 
     def setBoard(self,board):
-        # Sets the board.
+        # Sets the board (as a copy, with uint8 heights).
         # Should consideer adding some verification steps
-        self._board = board
+        self._board = np.array(board, dtype = np.uint8)
+        self._resetBounds()
 
     def setOptions(self,options):
-        # Sets the option 3D array.
+        # Sets the options, either as an N x N array of bitmasks, or as an
+        # N x N x N array of zeros and ones, where options[i,j,h-1] tells if
+        # the height h is possible on the cell (i,j).
         # Should consideer adding some verification steps
-        self._options = options
+        N = self._size
+        options = np.asarray(options)
+        if options.ndim == 3:
+            options = (options.astype(np.int64) << np.arange(N)).sum(axis = 2)
+        self._options = options.astype(_maskType(N))
 
 
     ###########
@@ -282,67 +860,143 @@ class SkyScraperPuzzle:
         #  - strategy: A string that specifies the solution strategy to follow.
         #
         if strategy == BACKTRACKING:
-            self.backtrackingSolve()
+            return self.backtrackingSolve()
+        if strategy == SAT:
+            return self.satSolve()
 
     def backtrackingSolve(self):
-        pass
+        # This method solves the puzzle by propagation and backtracking. The
+        # options are first reduced with the clues alone, and then the rules of
+        # the Latin Square and the orderings allowed by the clues of each line
+        # are propagated. When that is not enough, the search branches on the
+        # cell with the fewest options left. It returns True, and fills the
+        # board, if a solution was found. The number of heights tried is kept,
+        # and can be retrieved with getNodes.
+        #
+        solutions = self._solutions(1)
+        if not solutions:
+            return False
+        self._board = solutions[0]
+        self._options = _heightMasks(self._board, self._size)
+        self._resetBounds()
+        return True
+
+    def satSolve(self, solver = None, timeout = None):
+        # This method fills the board with a model of the formula of
+        # skyscraperCNF (with the heights already on the board), found by an
+        # external SAT solver or, if none is given, by puzzles.dpll. It returns
+        # True if a solution was found.
+        #
+        # INPUT:
+        #  - solver: OPTIONAL, the command of the SAT solver, as in
+        #            puzzles.solveCNF.
+        #  - timeout: OPTIONAL, the number of seconds the solver can run.
+        #
+        cnf = skyscraperCNF(self._lurd, self._board)
+        model = solveCNF(cnf, solver, timeout)
+        if model is None:
+            return False
+        self._board = skyscraperBoard(model, self._size)
+        self._options = _heightMasks(self._board, self._size)
+        self._resetBounds()
+        return True
+
+    def countSolutions(self, limit = 2):
+        # This method counts the solutions of the puzzle (the clues, together
+        # with the heights already on the board), stopping as soon as the count
+        # reaches the limit. With the default limit it tells if the puzzle has
+        # no solution (0), a unique solution (1) or more than one (2). The
+        # board is not modified.
+        #
+        return len(self._solutions(limit))
+
+    def _solutions(self, limit):
+        # Returns a list with up to limit solutions of the puzzle, found by the
+        # search of backtrackingSolve.
+        options = self._options & _heightMasks(self._board, self._size)
+        _cluePruning(options, self._lurd)
+        solutions = []
+        nodes = [0]
+        done = {}
+        if _propagate(options, self._lurd, done):
+            _search(options, self._lurd, done, limit, solutions, nodes)
+        self._nodes = nodes[0]
+        return solutions
 
     def stillViable(self):
-        # This method checks if the current state of the board is viable. It is
-        # mainly thought for a backgtracking approach, where the advance is done
-        # first from left to right, and then from top to bottom.
+        # This method checks if the current state of the board is viable: no
+        # height is repeated on a row or a column, and the number of visible
+        # skyscrapers from each end with a clue can still match it. The bounds
+        # of each line end are kept up to date by placeHeight and removeHeight,
+        # so this check takes constant time.
         #
-        if self.fullBoard():
-            currentLurd = generateLURD(self._board)
-            return np.array_equal(currentLurd, self._lurd)
-        else:
-            flag = True
-            for k in range(self._size):
-                if (np.where(self._board[k,:] > 0)[0].size > 0 and
-                    np.where(self._board[k,:] == 0)[0].size == 0):
-                    count_L = count_R = 0
-                    max_L   = max_R   = 0
-                    for j in range(self._size):
-                        if self._board[k,j] > max_L:
-                            max_L = self._board[k,j]
-                            count_L += 1
-                        if self._board[k,self._size-1-j] > max_R:
-                            max_R = self._board[k,self._size-1-j]
-                            count_R += 1
-                    if count_L != self._lurd[0,k] or count_R != self._lurd[2,k]:
-                        flag = False
-                elif np.where(self._board[k,:] > 0)[0].size > 0:
-                    count = 0
-                    max   = 0
-                    for j in range(self._size):
-                        if self._board[k,j] > max:
-                            max = self._board[k,j]
-                            count += 1
-                    if count > self._lurd[0,k]:
-                        flag = False
-                if (np.where(self._board[:,k] > 0)[0].size > 0 and
-                    np.where(self._board[:,k] == 0)[0].size == 0):
-                    count_U = count_D = 0
-                    max_U   = max_D   = 0
-                    for j in range(self._size):
-                        if self._board[j,k] > max_U:
-                            max_U = self._board[j,k]
-                            count_U += 1
-                        if self._board[self._size-1-j,K] > max_D:
-                            max_D = self._board[self._size-1-j,K]
-                            count_D += 1
-                    if count_U != self._lurd[1,k] or count_D != self._lurd[3,k]:
-                        flag = False
-                elif np.where(self._board[:,K] > 0)[0].size > 0:
-                    count = 0
-                    max   = 0
-                    for j in range(self._size):
-                        if self._board[j,k] > max:
-                            max = self._board[j,k]
-                            count += 1
-                    if count > self._lurd[0,k]:
-                        flag = False
-            return flag
+        return self._violations == 0
+
+    def visibilityBounds(self, side, k):
+        # Returns the lower and upper bounds of the number of skyscrapers that
+        # can be seen from one end of a line, with the current board.
+        #
+        # INPUT:
+        #  - side: integer, 0, 1, 2 or 3 for the Left, Up, Right or Down end,
+        #          as in LURD.
+        #  - k: integer, the index of the row or column.
+        #
+        return self._bounds[side*self._size + k]
+
+    def placeHeight(self, i, j, h):
+        # This method places the height h on the cell (i,j), updating only the
+        # bounds of the four ends of its row and column, and returns whether
+        # the board is still viable. The change can be undone in constant time
+        # with removeHeight.
+        #
+        N = self._size
+        saved = []
+        self._board[i,j] = h
+        row = self._board[i,:].tolist()
+        col = self._board[:,j].tolist()
+        for side, k, line in ((0, i, row), (1, j, col),
+                              (2, i, row[::-1]), (3, j, col[::-1])):
+            index = side*N + k
+            old = self._bounds[index]
+            new = _visibilityBounds(line, N)
+            saved.append((index, old))
+            self._bounds[index] = new
+            clue = self._lurd[side,k]
+            if clue:
+                self._violations += (not new[0] <= clue <= new[1]) - \
+                                    (not old[0] <= clue <= old[1])
+        self._history.append((i, j, saved))
+        return self._violations == 0
+
+    def removeHeight(self):
+        # This method undoes the last call to placeHeight that has not been
+        # undone yet, emptying the cell again and restoring its four bounds.
+        #
+        N = self._size
+        i, j, saved = self._history.pop()
+        self._board[i,j] = 0
+        for index, old in saved:
+            clue = self._lurd[index // N, index % N]
+            if clue:
+                new = self._bounds[index]
+                self._violations += (not old[0] <= clue <= old[1]) - \
+                                    (not new[0] <= clue <= new[1])
+            self._bounds[index] = old
+
+    def _resetBounds(self):
+        # Computes the bounds of every line end from scratch, and empties the
+        # history of placeHeight.
+        N = self._size
+        board = np.asarray(self._board)
+        lines = [board[k,:].tolist() for k in range(N)]
+        lines += [board[:,k].tolist() for k in range(N)]
+        lines += [line[::-1] for line in lines]
+        self._bounds = [_visibilityBounds(line, N) for line in lines]
+        clues = self._lurd.ravel().tolist()
+        self._violations = sum(1 for c, (lower, upper) in
+                               zip(clues, self._bounds)
+                               if c and not lower <= c <= upper)
+        self._history = []
 
 
 
@@ -26,14 +26,86 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+#
+# This module contains the code necessary to solve puzzles of the kind normally
+# called "Sudoku". A grid of N x N cells, with N = n^2, has to be filled with
+# the numbers 1,2,...,N in such a way that each of the scopes (the N rows, the
+# N columns and the N boxes of size n x n) contains each number exactly once.
+#
+# The grids are read, as in the MATLAB function gridReader, from a single line
+# that contains the rows of the grid one after the other, using the characters
+# of "123456789ABCDEFG" for the values, and anything else (usually 0 or .) for
+# the empty cells. Internally, the cells are numbered row by row, so the cell
+# (i,j) has index N*i + j, and the values that a cell may still take are kept
+# as a bitmask, where the bit k-1 is on if and only if the value k is still an
+# option for that cell.
+#
+# A samurai sudoku is made of five 9x9 grids: four in the corners of a 21x21
+# board, and one in the center that shares one box with each of them. Its lines
+# have 405 values, the five grids one after the other (top left, top right,
+# center, bottom left and bottom right), as in test/sudoku/samurai1000.txt.
+# The 369 distinct cells of the board are numbered row by row, so the shared
+# boxes are a single set of cells, and the whole samurai is solved at once by
+# the same propagation and search as the other grids, just with its own
+# scopes and peers.
+#
+# Any other variant is given by a scope matrix: an S x N array of int32 with
+# the cells of each scope on a row (latinScopes, diagonalScopes for X-sudoku,
+# windokuScopes and jigsawScopes build the usual ones). The solver only sees
+# the scopes through scopeIndex, that gives the scopes and the peers of each
+# cell in compressed form, so the same propagation and search work for all of
+# them, and the propagation only checks for hidden singles the scopes of the
+# cells whose options have changed.
+#
+
 ###########
 # IMPORTS #
 ###########
-from math import sqrt
+import argparse
+import sys
+
+from itertools import islice
+from math import isqrt
+
+import numpy as np
+
+from puzzles import CNF, ExactCover, parallelMap, solveCNF
 
 ####################
 # GLOBAL VARIABLES #
 ####################
+BACKTRACKING = "BACKTRACKING"
+DANCING_LINKS = "DANCINGLINKS"
+SAT = "SAT"
+ROTATIONAL = "ROTATIONAL" # Symmetries of the clues of a generated puzzle.
+MIRROR = "MIRROR"
+EASY = "EASY" # Difficulties of a generated puzzle.
+HARD = "HARD"
+SAMURAI = "SAMURAI"
+ALPHABET = "123456789ABCDEFG"
+
+_TABLES = {} # Tables already computed for the solver, indexed by box size, by
+             # SAMURAI, or by the bytes of a scope matrix.
+# Number of bits on of a mask (int.bit_count is only there from Python 3.10).
+_bitCount = getattr(int, "bit_count", lambda mask: bin(mask).count("1"))
+
+# Rows and columns, on the 21x21 board, of the upper left corner of each of the
+# grids of a samurai sudoku, in the order of the lines.
+SAMURAI_CORNERS = ((0, 0), (0, 12), (6, 6), (12, 0), (12, 12))
+
+# Lengths of the lines that contain puzzles in the files of test/sudoku: the
+# grids of 4x4, 9x9 and 16x16, and the samurai sudokus, made of five 9x9 grids.
+LAYOUTS = {16 : "4x4", 81 : "9x9", 256 : "16x16", 405 : SAMURAI}
+
+# Translation table from the characters of a line to the values of the cells.
+# The characters that can not be part of a grid are mapped to 255.
+_CELLS = bytearray([255]*256)
+_CELLS[ord("0")] = _CELLS[ord(".")] = 0
+for _k, _c in enumerate(ALPHABET):
+    _CELLS[ord(_c)] = _k + 1
+_CELLS = bytes(_CELLS)
+_SPACES = bytes(range(33)) + b"\x7f" # Deleted from the lines before reading.
+
 
 ###################
 ###################
@@ -47,6 +119,661 @@ from math import sqrt
 ###################
 ###################
 
+def standardScopes(n):
+    # This function generates the standard scopes of a sudoku grid with n^2 x
+    # n^2 cells, in the same order as the MATLAB function standardScopes: first
+    # the columns, then the rows, and then the boxes.
+    #
+    # INPUT:
+    #  - n: integer, the square root of the side of the grid.
+    #
+    # OUTPUT:
+    #  - scopes: A list with 3*n^2 lists, each containing the indices of the
+    #            cells in one scope.
+    #
+    N = n*n
+    scopes = [[N*i + j for i in range(N)] for j in range(N)]
+    scopes += [[N*i + j for j in range(N)] for i in range(N)]
+    for k in range(N):
+        i0 = n*(k % n)
+        j0 = n*(k // n)
+        scopes.append([N*(i0+i) + j0 + j for i in range(n) for j in range(n)])
+    return scopes
+
+
+def latinScopes(N):
+    # This function generates the scopes of a Latin square of side N, in the
+    # same order as the MATLAB function latinScopes: first the columns, and
+    # then the rows.
+    #
+    # INPUT:
+    #  - N: integer, the side of the square.
+    #
+    # OUTPUT:
+    #  - scopes: A list with 2*N lists, each containing the indices of the
+    #            cells in one scope.
+    #
+    scopes = [[N*i + j for i in range(N)] for j in range(N)]
+    scopes += [[N*i + j for j in range(N)] for i in range(N)]
+    return scopes
+
+
+def diagonalScopes(n):
+    # This function generates the scopes of an X-sudoku: those of
+    # standardScopes, and then the two main diagonals, first the one starting
+    # on the upper left corner, as in validateGrids.
+    N = n*n
+    return standardScopes(n) + [[(N+1)*k for k in range(N)],
+                                [(N-1)*(k+1) for k in range(N)]]
+
+
+def windokuScopes(n):
+    # This function generates the scopes of a windoku: those of
+    # standardScopes, and then the (n-1)^2 extra boxes of size n x n that are
+    # separated from each other, and from the sides of the grid, by a single
+    # row and a single column (the four windows of the 9x9 windoku).
+    N = n*n
+    scopes = standardScopes(n)
+    for k in range((n-1)**2):
+        i0 = 1 + (n+1)*(k % (n-1))
+        j0 = 1 + (n+1)*(k // (n-1))
+        scopes.append([N*(i0+i) + j0 + j for i in range(n) for j in range(n)])
+    return scopes
+
+
+def jigsawScopes(regions):
+    # This function generates the scopes of a jigsaw sudoku, whose boxes are
+    # replaced by irregular regions of N cells: first the columns and the
+    # rows, as in latinScopes, and then the regions, in the order in which
+    # they first appear.
+    #
+    # INPUT:
+    #  - regions: The label of the region of each cell, row by row, either as
+    #             a string with one character per cell, or as a list or array
+    #             (of N^2 labels, or N x N).
+    #
+    # OUTPUT:
+    #  - scopes: A list with 3*N lists, each containing the indices of the
+    #            cells in one scope.
+    #
+    if not isinstance(regions, str):
+        regions = np.asarray(regions).ravel().tolist()
+    N = isqrt(len(regions))
+    cells = {}
+    for c, label in enumerate(regions):
+        cells.setdefault(label, []).append(c)
+    if N*N != len(regions) or any(len(r) != N for r in cells.values()):
+        raise ValueError("The regions must be N regions of N cells each.")
+    return latinScopes(N) + list(cells.values())
+
+
+def scopeMatrix(scopes):
+    # This function turns a list of scopes (of the same length) into a scope
+    # matrix: an S x N NumPy array of int32, with the cells of each scope on a
+    # row. A scope matrix is returned as it is.
+    scopes = np.asarray(scopes)
+    if scopes.ndim != 2:
+        raise ValueError("The scopes must all have the same number of cells.")
+    return np.ascontiguousarray(scopes, dtype = np.int32)
+
+
+def scopeIndex(scopes, cells = None):
+    # This function computes, for a scope matrix, the scopes of each cell and
+    # the peers of each cell (the other cells that share a scope with it), in
+    # compressed form: the scopes of the cell c are
+    # incidence[starts[c]:starts[c+1]], and its peers (in increasing order)
+    # are peers[offsets[c]:offsets[c+1]].
+    #
+    # INPUT:
+    #  - scopes: A scope matrix, or anything that scopeMatrix accepts.
+    #  - cells: OPTIONAL, the number of cells. By default, one more than the
+    #           greatest cell of the scopes.
+    #
+    # OUTPUT:
+    #  - starts, incidence, offsets, peers: Arrays of int32.
+    #
+    scopes = scopeMatrix(scopes)
+    S, N = scopes.shape
+    if cells is None:
+        cells = int(scopes.max()) + 1
+    flat = scopes.ravel()
+    order = np.argsort(flat, kind = "stable")
+    starts = np.zeros(cells + 1, dtype = np.int32)
+    np.cumsum(np.bincount(flat, minlength = cells), out = starts[1:])
+    incidence = (order // N).astype(np.int32)
+    pairs = (scopes[:,:,None].astype(np.int64)*cells +
+             scopes[:,None,:]).ravel()
+    pairs = np.unique(pairs[pairs // cells != pairs % cells])
+    offsets = np.zeros(cells + 1, dtype = np.int32)
+    np.cumsum(np.bincount(pairs // cells, minlength = cells),
+              out = offsets[1:])
+    return starts, incidence, offsets, (pairs % cells).astype(np.int32)
+
+
+def samuraiScopes():
+    # This function generates the scopes of a samurai sudoku, over its 369
+    # distinct cells: the scopes of standardScopes for each of the five grids,
+    # with the boxes that two grids share given only once.
+    #
+    # OUTPUT:
+    #  - cells: A list with the 405 positions of a line of a samurai sudoku,
+    #           giving for each one its distinct cell.
+    #  - scopes: A list with 131 lists, each containing the indices of the
+    #            cells in one scope.
+    #
+    positions = [(i0 + i, j0 + j) for i0, j0 in SAMURAI_CORNERS
+                 for i in range(9) for j in range(9)]
+    index = {p : k for k, p in enumerate(sorted(set(positions)))}
+    cells = [index[p] for p in positions]
+    scopes = []
+    seen = set()
+    for k in range(5):
+        for scope in standardScopes(3):
+            scope = [cells[81*k + c] for c in scope]
+            if frozenset(scope) not in seen:
+                seen.add(frozenset(scope))
+                scopes.append(scope)
+    return cells, scopes
+
+
+def gridReader(gridLine):
+    # This function takes a string that contains, in a single line, the rows of
+    # the grid, with the values in the right places, and anything else in the
+    # empty cells. It mimics the MATLAB function with the same name.
+    #
+    # INPUT:
+    #  - gridLine: A string of length N^2, with N no greater than 16. The values
+    #              are given with the characters in "123456789ABCDEFG".
+    #
+    # OUTPUT:
+    #  - grid: A list of N^2 integers, row by row, with zeros on the empty
+    #          cells.
+    #
+    N = isqrt(len(gridLine))
+    if N*N != len(gridLine) or isqrt(N)**2 != N:
+        raise ValueError("The length of the line is not a valid grid size.")
+    values = {c : k+1 for k, c in enumerate(ALPHABET[:N])}
+    return [values.get(c, 0) for c in gridLine]
+
+
+def gridWriter(grid, blank = "."):
+    # This function does the opposite of gridReader. It takes a list of N^2
+    # integers and returns the line representing the grid.
+    #
+    # INPUT:
+    #  - grid: A list of N^2 integers, row by row, with zeros on the empty
+    #          cells.
+    #  - blank: OPTIONAL, the character used for the empty cells.
+    #
+    # OUTPUT:
+    #  - gridLine: A string of length N^2 representing the grid.
+    #
+    return "".join(ALPHABET[v-1] if v else blank for v in grid)
+
+
+def puzzleReader(path, length = None):
+    # This generator reads a file of puzzles, one per line, and yields them one
+    # at a time, so that files of any size can be processed in constant memory.
+    # It accepts the different layouts of the files in test/sudoku: zeros or
+    # dots for the empty cells, headers with the number of puzzles, or lines of
+    # text, which are skipped, and the 405 digit lines of samurai sudokus.
+    #
+    # INPUT:
+    #  - path: The path of the file to be read.
+    #  - length: OPTIONAL, the length of the lines that contain puzzles (one of
+    #            the keys of LAYOUTS). If not given, it is taken from the first
+    #            line that contains a puzzle.
+    #
+    # OUTPUT:
+    #  - Yields a bytes object for each puzzle, with one byte per cell, row by
+    #    row, containing the value of the cell, or zero for the empty ones. It
+    #    can be given directly to SudokuPuzzle, or to numpy.frombuffer.
+    #
+    with open(path, "rb") as f:
+        for line in f:
+            cells = line.translate(_CELLS, _SPACES)
+            if len(cells) != length and \
+               (length is not None or len(cells) not in LAYOUTS):
+                continue
+            if max(cells) > (9 if len(cells) == 405 else isqrt(len(cells))):
+                continue
+            length = len(cells)
+            yield cells
+
+
+def countSolutions(puzzle, limit = 2):
+    # This function counts the solutions of a puzzle, stopping as soon as the
+    # count reaches the limit. With the default limit it tells if a puzzle has
+    # no solution (0), a unique solution (1) or more than one (2).
+    #
+    # INPUT:
+    #  - puzzle: Either a SudokuPuzzle, or its clues in any of the forms that
+    #            SudokuPuzzle accepts, or the 405 cells of a samurai sudoku.
+    #  - limit: OPTIONAL, the number of solutions after which the count stops.
+    #
+    # OUTPUT:
+    #  - count: The number of solutions, no greater than limit.
+    #
+    if not isinstance(puzzle, SudokuPuzzle):
+        if len(puzzle) == 405:
+            puzzle = SamuraiPuzzle(puzzle)
+        else:
+            puzzle = SudokuPuzzle(puzzle)
+    return puzzle.countSolutions(limit)
+
+
+def randomGrid(n = 3, rng = None):
+    # This function generates a random full grid. The boxes on the diagonal,
+    # that do not share any scope, are filled with random permutations, the
+    # rest of the grid is completed by the solver, and finally a random
+    # transformation that keeps the scopes is applied: the values are
+    # relabeled, the bands and the rows within each band are permuted, and so
+    # are the stacks and the columns within each stack, and the grid is
+    # transposed half of the time.
+    #
+    # INPUT:
+    #  - n: OPTIONAL, the square root of the side of the grid.
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #
+    # OUTPUT:
+    #  - grid: A list of N^2 integers, row by row.
+    #
+    rng = np.random.default_rng(rng)
+    N = n*n
+    clues = [0]*(N*N)
+    for k in range(n):
+        values = (rng.permutation(N) + 1).tolist()
+        for i in range(n):
+            for j in range(n):
+                clues[N*(n*k + i) + n*k + j] = values[n*i + j]
+    puzzle = SudokuPuzzle(clues)
+    puzzle.solve()
+    grid = puzzle.getGrid()
+    symbols = [0] + (rng.permutation(N) + 1).tolist()
+    rows = [n*b + i for b in rng.permutation(n) for i in rng.permutation(n)]
+    cols = [n*b + j for b in rng.permutation(n) for j in rng.permutation(n)]
+    if rng.integers(2):
+        return [symbols[grid[N*rows[j] + cols[i]]]
+                for i in range(N) for j in range(N)]
+    return [symbols[grid[N*rows[i] + cols[j]]]
+            for i in range(N) for j in range(N)]
+
+
+def generatePuzzle(n = 3, clues = 0, symmetry = None, difficulty = None,
+                   rng = None, attempts = 100):
+    # This function generates a puzzle with a unique solution. It starts from
+    # a random full grid, and goes through the cells in a random order,
+    # removing each clue (or each group of symmetric clues) as long as the
+    # solution remains unique. If no number of clues is given, the result is
+    # minimal: no clue (or group) can be removed.
+    #
+    # INPUT:
+    #  - n: OPTIONAL, the square root of the side of the grid.
+    #  - clues: OPTIONAL, the number of clues at which the removal stops.
+    #  - symmetry: OPTIONAL, None, ROTATIONAL (the clues are symmetric by a
+    #              half turn) or MIRROR (symmetric by the vertical axis).
+    #  - difficulty: OPTIONAL, None, EASY (can be solved by propagation alone)
+    #                or HARD (the solver has to backtrack).
+    #  - rng: OPTIONAL, a numpy.random.Generator, or a seed for one.
+    #  - attempts: OPTIONAL, the number of grids to try before giving up when
+    #              the difficulty is HARD.
+    #
+    # OUTPUT:
+    #  - puzzle: A list of N^2 integers, row by row, with zeros on the empty
+    #            cells.
+    #
+    rng = np.random.default_rng(rng)
+    N = n*n
+    NN = N*N
+    if symmetry == ROTATIONAL:
+        groups = [{c, NN-1-c} for c in range((NN+1)//2)]
+    elif symmetry == MIRROR:
+        groups = [{N*i + j, N*i + N-1-j} for i in range(N)
+                  for j in range((N+1)//2)]
+    elif symmetry is None:
+        groups = [{c} for c in range(NN)]
+    else:
+        raise ValueError("Unknown symmetry: " + str(symmetry))
+    for attempt in range(attempts):
+        puzzle = randomGrid(n, rng)
+        left = NN
+        for k in rng.permutation(len(groups)).tolist():
+            if left <= clues:
+                break
+            trial = list(puzzle)
+            for c in groups[k]:
+                trial[c] = 0
+            reduced = SudokuPuzzle(trial)
+            if difficulty == EASY and not reduced.fullGrid():
+                continue
+            if reduced.countSolutions(2) == 1:
+                puzzle = trial
+                left -= len(groups[k])
+        if difficulty != HARD or not SudokuPuzzle(puzzle).fullGrid():
+            return puzzle
+    raise RuntimeError("No puzzle of the given difficulty was found.")
+
+
+def generatePuzzles(count, workers = None, seed = None, chunksize = 16,
+                    **options):
+    # This generator produces many puzzles with generatePuzzle, on a pool of
+    # processes. Each puzzle gets its own random generator, spawned from the
+    # seed, so the output does not depend on the number of workers.
+    #
+    # INPUT:
+    #  - count: The number of puzzles.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - seed: OPTIONAL, the seed of the whole run.
+    #  - chunksize: OPTIONAL, the number of puzzles generated by each task.
+    #  - options: OPTIONAL, the keyword arguments of generatePuzzle.
+    #
+    # OUTPUT:
+    #  - Yields each puzzle as a single line, with dots on the empty cells, as
+    #    in test/sudoku/randommostlyeasy.txt.
+    #
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    tasks = ((seeds[k:k+chunksize], options)
+             for k in range(0, count, chunksize))
+    for lines in parallelMap(_generateChunk, tasks, workers):
+        yield from lines
+
+
+def gridArrays(path, batch = 65536):
+    # This generator reads a file of grids with puzzleReader, and yields them
+    # in batches, as NumPy arrays built directly from the bytes of the lines.
+    #
+    # INPUT:
+    #  - path: The path of the file to be read.
+    #  - batch: OPTIONAL, the maximum number of grids in each array.
+    #
+    # OUTPUT:
+    #  - Yields B x N x N NumPy arrays of uint8, with B no greater than batch,
+    #    or B x 5 x 9 x 9 for the samurai sudokus.
+    #
+    reader = puzzleReader(path)
+    while True:
+        lines = list(islice(reader, batch))
+        if not lines:
+            return
+        grids = np.frombuffer(b"".join(lines), dtype = np.uint8)
+        if len(lines[0]) == 405:
+            yield grids.reshape(-1,5,9,9)
+        else:
+            N = isqrt(len(lines[0]))
+            yield grids.reshape(-1,N,N)
+
+
+def validateGrids(grids, diagonals = False):
+    # This function checks, all at once, if many full grids are valid sudoku
+    # solutions. Each value is turned into a bit, and the bits of each scope
+    # are combined with a bitwise or, so a scope is correct if and only if all
+    # of its N bits are on.
+    #
+    # INPUT:
+    #  - grids: A B x N x N NumPy array of integers, with N = n^2.
+    #  - diagonals: OPTIONAL, if True the two main diagonals are also checked,
+    #               as in X-sudoku.
+    #
+    # OUTPUT:
+    #  - valid: A NumPy array of B booleans, True for the valid grids.
+    #  - violation: A NumPy array of B integers, with the index of the first
+    #               scope that is not correct in each grid, or -1 for the valid
+    #               ones. The scopes are numbered as in standardScopes, and the
+    #               diagonals, if checked, come last (first the one starting on
+    #               the upper left corner).
+    #
+    B, N = grids.shape[0], grids.shape[1]
+    n = isqrt(N)
+    full = ((1 << N) - 1) << 1
+    bits = np.left_shift(np.uint32(1), grids.astype(np.uint32))
+    scopes = [np.bitwise_or.reduce(bits, axis = 1),
+              np.bitwise_or.reduce(bits, axis = 2),
+              np.bitwise_or.reduce(bits.reshape(B,n,n,n,n), axis = (2,4))
+                .transpose(0,2,1).reshape(B,N)]
+    if diagonals:
+        k = np.arange(N)
+        scopes.append(np.bitwise_or.reduce(bits[:,k,k], axis = 1)[:,None])
+        scopes.append(np.bitwise_or.reduce(bits[:,k,N-1-k], axis = 1)[:,None])
+    wrong = np.concatenate(scopes, axis = 1) != full
+    valid = ~wrong.any(axis = 1)
+    violation = np.where(valid, -1, wrong.argmax(axis = 1))
+    return valid, violation
+
+
+def validateSamurais(grids):
+    # This function checks, all at once, if many full samurai sudokus are
+    # valid: each of their five grids with validateGrids, and then the boxes
+    # that the center grid shares with the others.
+    #
+    # INPUT:
+    #  - grids: A B x 5 x 9 x 9 NumPy array of integers, as yielded by
+    #           gridArrays for a file of samurai sudokus.
+    #
+    # OUTPUT:
+    #  - valid: A NumPy array of B booleans, True for the valid samurais.
+    #  - violation: A NumPy array of B integers, with the index of the first
+    #               scope that is not correct in each samurai, or -1 for the
+    #               valid ones. The 27 scopes of the grid k (in the order of
+    #               the lines) are numbered from 27*k, and the four shared
+    #               boxes (top left, top right, bottom left and bottom right of
+    #               the center grid) are 135 to 138.
+    #
+    B = grids.shape[0]
+    valid, violation = validateGrids(grids.reshape(5*B,9,9))
+    wrong = (violation >= 0).reshape(B,5)
+    first = wrong.argmax(axis = 1)
+    center = grids[:,2]
+    shared = [(grids[:,0,6:,6:] != center[:,:3,:3]),
+              (grids[:,1,6:,:3] != center[:,:3,6:]),
+              (grids[:,3,:3,6:] != center[:,6:,:3]),
+              (grids[:,4,:3,:3] != center[:,6:,6:])]
+    shared = np.stack([box.any(axis = (1,2)) for box in shared], axis = 1)
+    valid = ~wrong.any(axis = 1) & ~shared.any(axis = 1)
+    violation = np.where(wrong.any(axis = 1),
+                         27*first + violation.reshape(B,5)[np.arange(B),first],
+                         135 + shared.argmax(axis = 1))
+    return valid, np.where(valid, -1, violation)
+
+
+def validateScopes(grids, scopes):
+    # This function checks, all at once, if many full grids hold each value
+    # once on every scope of a scope matrix, as validateGrids does for the
+    # standard scopes.
+    #
+    # INPUT:
+    #  - grids: A B x C NumPy array of integers (or B x N x N), with the
+    #           values of the C cells of each grid.
+    #  - scopes: A scope matrix, or anything that scopeMatrix accepts.
+    #
+    # OUTPUT:
+    #  - valid: A NumPy array of B booleans, True for the valid grids.
+    #  - violation: A NumPy array of B integers, with the index of the first
+    #               scope that is not correct in each grid, or -1 for the valid
+    #               ones.
+    #
+    scopes = scopeMatrix(scopes)
+    full = ((1 << scopes.shape[1]) - 1) << 1
+    bits = np.left_shift(np.uint32(1),
+                         grids.reshape(grids.shape[0], -1).astype(np.uint32))
+    wrong = np.bitwise_or.reduce(bits[:,scopes], axis = 2) != full
+    valid = ~wrong.any(axis = 1)
+    violation = np.where(valid, -1, wrong.argmax(axis = 1))
+    return valid, violation
+
+
+def exactCoverSolutions(clues, limit = 1):
+    # This function solves a sudoku grid as an exact cover problem, with the
+    # Dancing Links of the class ExactCover. Placing the value v in the cell
+    # (i,j) covers the cell itself, and the value v in the row i, in the column
+    # j and in the box of the cell. It works for sizes 4x4 through 16x16.
+    #
+    # INPUT:
+    #  - clues: Either a string with the grid in a single line, as read by
+    #           gridReader, or a list of N^2 integers, row by row, with zeros
+    #           on the empty cells.
+    #  - limit: OPTIONAL, the number of solutions after which the search stops.
+    #           Using 2 tells if the solution is unique.
+    #
+    # OUTPUT:
+    #  - solutions: A list with up to limit solutions, each one a list of N^2
+    #               integers, row by row.
+    #  - nodes: The number of rows tried by the search.
+    #
+    if isinstance(clues, str):
+        clues = gridReader(clues)
+    N = isqrt(len(clues))
+    n = isqrt(N)
+    if N*N != len(clues) or n*n != N:
+        raise ValueError("The number of cells is not a valid grid size.")
+    NN = N*N
+    rows = []
+    for i in range(N):
+        for j in range(N):
+            b = n*(i // n) + j // n
+            for v in range(N):
+                rows.append([N*i + j, NN + N*i + v, 2*NN + N*j + v,
+                             3*NN + N*b + v])
+    cover = ExactCover(4*NN, rows)
+    for c, v in enumerate(clues):
+        if v:
+            if not 0 < v <= N or not cover.select(N*c + v - 1):
+                return [], 0
+    solutions = []
+    for solution in cover.solve(limit):
+        grid = [0]*NN
+        for r in solution:
+            grid[r // N] = r % N + 1
+        solutions.append(grid)
+    return solutions, cover.getNodes()
+
+
+def sudokuCNF(clues, scopes = None):
+    # This function encodes a sudoku grid as a CNF formula, to be solved with
+    # puzzles.solveCNF or written for an external SAT solver. The variable
+    # N*c + v stands for the cell c having the value v, so the first N^3
+    # variables are the grid. Each cell, and each value on each scope, is
+    # there exactly once. It works for any size (25x25 included), as the
+    # values are not read from characters.
+    #
+    # INPUT:
+    #  - clues: Either a string with the grid in a single line, as read by
+    #           gridReader, or a list of N^2 integers, row by row, with zeros
+    #           on the empty cells.
+    #  - scopes: OPTIONAL, a list of lists of cells that must contain every
+    #            value once. By default, the ones of standardScopes. If given,
+    #            N is the length of the scopes, and clues may have any number
+    #            of cells (as the 369 of samuraiScopes).
+    #
+    # OUTPUT:
+    #  - cnf: A puzzles.CNF object with the formula.
+    #
+    if isinstance(clues, str):
+        clues = gridReader(clues)
+    if scopes is None:
+        N = isqrt(len(clues))
+        scopes = standardScopes(isqrt(N))
+    else:
+        N = len(scopes[0])
+    cnf = CNF(N*len(clues))
+    values = range(1, N+1)
+    for c in range(len(clues)):
+        cnf.exactlyOne([N*c + v for v in values])
+    for scope in scopes:
+        for v in values:
+            cnf.exactlyOne([N*c + v for c in scope])
+    for c, v in enumerate(clues):
+        if v:
+            cnf.addClause([N*c + v])
+    return cnf
+
+
+def sudokuGrid(model, N, cells = None):
+    # Returns the list of N^2 values (or of the given number of cells) of the
+    # grid given by a model of the formula of sudokuCNF.
+    if cells is None:
+        cells = N*N
+    grid = [0]*cells
+    for literal in model:
+        if 0 < literal <= N*cells:
+            c, v = divmod(literal - 1, N)
+            grid[c] = v + 1
+    return grid
+
+
+def solveMany(puzzles, workers = None, chunksize = 256, ordered = True,
+              strategy = BACKTRACKING):
+    # This generator solves many puzzles on a pool of processes. The puzzles
+    # are sent to the workers in chunks, so the cost of the communication is
+    # shared by many puzzles, and they are taken from the iterable only as
+    # they are needed, so a whole file can be solved in constant memory.
+    #
+    # INPUT:
+    #  - puzzles: An iterable of puzzles, in any of the forms accepted by
+    #             SudokuPuzzle (for example, the output of puzzleReader), or
+    #             samurai sudokus of 405 cells.
+    #  - workers: OPTIONAL, the number of processes. By default, the number of
+    #             cores.
+    #  - chunksize: OPTIONAL, the number of puzzles sent together to a worker.
+    #  - ordered: OPTIONAL, if True the solutions are yielded in the order of
+    #             the puzzles, otherwise as the chunks are completed.
+    #  - strategy: OPTIONAL, the strategy used to solve each puzzle.
+    #
+    # OUTPUT:
+    #  - Yields a pair (index, line) for each puzzle, where index is the
+    #    position of the puzzle in the iterable, and line is the solved grid
+    #    in a single line, or None if the puzzle has no solution.
+    #
+    for results in parallelMap(_solveChunk,
+                               _chunks(puzzles, chunksize, strategy),
+                               workers, ordered):
+        yield from results
+
+
+def main(argv = None):
+    # This is the command line entry point. It solves every puzzle of a file,
+    # and writes the solutions, one per line, in the order of the puzzles. The
+    # puzzles with no solution are written as empty lines. With --validate,
+    # the file must contain full grids (or samurais), and it writes instead
+    # the number of valid ones and the index of each one that is not.
+    #
+    parser = argparse.ArgumentParser(
+        description = "Solve every sudoku in a file of puzzles.")
+    parser.add_argument("path", help = "file with one puzzle per line")
+    parser.add_argument("-o", "--output", help = "file for the solutions")
+    parser.add_argument("-w", "--workers", type = int, default = None,
+                        help = "number of processes (default: all cores)")
+    parser.add_argument("-c", "--chunksize", type = int, default = 256,
+                        help = "number of puzzles sent together to a worker")
+    parser.add_argument("-s", "--strategy", default = BACKTRACKING,
+                        choices = [BACKTRACKING, DANCING_LINKS, SAT])
+    parser.add_argument("-v", "--validate", action = "store_true",
+                        help = "check full grids instead of solving puzzles")
+    parser.add_argument("-x", "--diagonals", action = "store_true",
+                        help = "also check the diagonals when validating")
+    args = parser.parse_args(argv)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.validate:
+            count = start = 0
+            for grids in gridArrays(args.path):
+                if grids.ndim == 4:
+                    valid, violation = validateSamurais(grids)
+                else:
+                    valid, violation = validateGrids(grids, args.diagonals)
+                count += int(valid.sum())
+                for k in np.flatnonzero(~valid).tolist():
+                    out.write("%d %d\n" % (start + k, violation[k]))
+                start += len(grids)
+            out.write("%d of %d valid\n" % (count, start))
+            return
+        for index, line in solveMany(puzzleReader(args.path), args.workers,
+                                     args.chunksize, True, args.strategy):
+            out.write((line or "") + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
 
 ###############
 ###############
@@ -56,6 +783,190 @@ from math import sqrt
 ###############
 ###############
 
+def _tables(n):
+    # Returns (and caches) the tables of _scopeTables for grids with boxes of
+    # size n x n.
+    if n not in _TABLES:
+        _TABLES[n] = _scopeTables(scopeMatrix(standardScopes(n)))
+    return _TABLES[n]
+
+
+def _samuraiLayout():
+    # Returns (and caches) the cells of samuraiScopes, its scopes as a scope
+    # matrix, and their tables of _scopeTables.
+    if SAMURAI not in _TABLES:
+        cells, scopes = samuraiScopes()
+        scopes = scopeMatrix(scopes)
+        _TABLES[SAMURAI] = (tuple(cells), scopes,
+                            _scopeTables(scopes, max(cells) + 1))
+    return _TABLES[SAMURAI]
+
+
+def _scopeTables(scopes, cells = None):
+    # Returns (and caches, by the bytes of the matrix) the tables used by the
+    # solver for a scope matrix: the scopes, the peers of each cell and the
+    # scopes of each cell, as tuples taken from the arrays of scopeIndex.
+    key = (scopes.shape, cells, scopes.tobytes())
+    if key not in _TABLES:
+        starts, incidence, offsets, peers = scopeIndex(scopes, cells)
+        _TABLES[key] = (tuple(map(tuple, scopes.tolist())),
+                        _rows(peers, offsets), _rows(incidence, starts))
+    return _TABLES[key]
+
+
+def _rows(indices, offsets):
+    # Returns the rows of a matrix in compressed form as a tuple of tuples.
+    indices, offsets = indices.tolist(), offsets.tolist()
+    return tuple(tuple(indices[offsets[k]:offsets[k+1]])
+                 for k in range(len(offsets) - 1))
+
+
+def _chunks(puzzles, chunksize, strategy):
+    # Splits the puzzles in the tasks of solveMany: tuples with the index of
+    # the first puzzle, the list of puzzles, and the strategy.
+    puzzles = iter(puzzles)
+    start = 0
+    while True:
+        chunk = list(islice(puzzles, chunksize))
+        if not chunk:
+            return
+        yield start, chunk, strategy
+        start += len(chunk)
+
+
+def _solveChunk(task):
+    # Solves the puzzles of one task of solveMany, and returns the list of the
+    # pairs (index, line) of its solutions.
+    start, chunk, strategy = task
+    results = []
+    for k, clues in enumerate(chunk):
+        if len(clues) == 405:
+            puzzle = SamuraiPuzzle(clues)
+        else:
+            puzzle = SudokuPuzzle(clues)
+        if puzzle.solve(strategy):
+            results.append((start + k, puzzle.getLine()))
+        else:
+            results.append((start + k, None))
+    return results
+
+
+def _generateChunk(task):
+    # Generates the puzzles of one task of generatePuzzles, and returns them as
+    # lines.
+    seeds, options = task
+    return [gridWriter(generatePuzzle(rng = np.random.default_rng(seed),
+                                      **options)) for seed in seeds]
+
+
+def _propagate(options, grid, queue, tables, full, dirty = None):
+    # This is the constraint propagation of the solver. The list queue contains
+    # the cells whose options have been reduced to a single value, but that
+    # have not been filled yet. Each of them is filled in (naked singles), and
+    # its value removed from the options of its peers. Once there is nothing
+    # left in the queue, the scopes of the cells whose options changed are
+    # checked for values that can only go in one of their cells (hidden
+    # singles), and the whole thing starts again.
+    #
+    # INPUT:
+    #  - options, grid, queue: The state, and the cells to be filled.
+    #  - tables: The scopes, peers and incidence of the grid, as returned by
+    #            _scopeTables.
+    #  - full: The bitmask with all values on.
+    #  - dirty: OPTIONAL, a set with the scopes to be checked the first time.
+    #           By default, the scopes of the cells on the queue.
+    #
+    # OUTPUT:
+    #  - viable: False if a contradiction was found, True otherwise.
+    #
+    scopes, peers, incidence = tables
+    if dirty is None:
+        dirty = set()
+        for c in queue:
+            dirty.update(incidence[c])
+    while True:
+        while queue:
+            c = queue.pop()
+            if grid[c]:
+                continue
+            b = options[c]
+            grid[c] = b.bit_length()
+            nb = ~b
+            for p in peers[c]:
+                m = options[p]
+                if m & b:
+                    m &= nb
+                    if not m:
+                        return False
+                    options[p] = m
+                    dirty.update(incidence[p])
+                    if not m & (m-1):
+                        queue.append(p)
+        checking, dirty = dirty, set()
+        for k in checking:
+            scope = scopes[k]
+            once = twice = 0
+            for c in scope:
+                m = options[c]
+                twice |= once & m
+                once |= m
+            if once != full:
+                return False
+            hidden = once & ~twice
+            if hidden:
+                for c in scope:
+                    m = options[c] & hidden
+                    if m and not grid[c]:
+                        if m & (m-1):
+                            return False
+                        options[c] = m
+                        dirty.update(incidence[c])
+                        queue.append(c)
+        if not queue:
+            return True
+
+
+def _search(options, grid, tables, full, limit, solutions, score):
+    # This is the backtracking part of the solver. The cell with the fewest
+    # options left is chosen, and each of its options is tried in turn on a
+    # copy of the state, which is propagated before going deeper.
+    #
+    # INPUT:
+    #  - options, grid: The state, already propagated.
+    #  - tables: The scopes, peers and incidence of the grid.
+    #  - full: The bitmask with all values on.
+    #  - limit: The number of solutions after which the search stops.
+    #  - solutions: A list where the solutions found are appended.
+    #  - score: A list with a single integer, the number of values tried.
+    #
+    bitCount = _bitCount
+    best = -1
+    fewest = full.bit_length() + 1
+    for c, v in enumerate(grid):
+        if not v:
+            k = bitCount(options[c])
+            if k < fewest:
+                best = c
+                fewest = k
+                if k == 2:
+                    break
+    if best < 0:
+        solutions.append(list(grid))
+        return
+    m = options[best]
+    while m:
+        b = m & -m
+        m ^= b
+        score[0] += 1
+        newOptions = list(options)
+        newGrid = list(grid)
+        newOptions[best] = b
+        if _propagate(newOptions, newGrid, [best], tables, full):
+            _search(newOptions, newGrid, tables, full, limit, solutions, score)
+            if len(solutions) >= limit:
+                return
+
+
 
 ###################
 ###################
@@ -70,39 +981,392 @@ from math import sqrt
 ###################
 
 
-#######################
-#######################
-##                   ##
-##  CLASS SOMECLASS  ##
-##                   ##
-#######################
-#######################
-class SomeClass:
-    # Description.
+##########################
+##########################
+##                      ##
+##  CLASS SUDOKUPUZZLE  ##
+##                      ##
+##########################
+##########################
+class SudokuPuzzle:
+    # This class contains the clues and the grid of a sudoku puzzle, together
+    # with the options still available for each cell, and the logic necessary
+    # to solve it. The options are kept as one bitmask per cell, and the solver
+    # combines constraint propagation (naked and hidden singles) with
+    # backtracking on the cell with the fewest options.
+    #
+    # NOTE:
+    #  - The attribute _backtrackingScore counts the number of values tried
+    #    during the search, in the same way as the field backtrackingscore of
+    #    the MATLAB function sudokuSolver, so both can be compared.
+    #
 
     ##############
     # ATTRIBUTES #
     ##############
+    _size              = 0
+    _boxSize           = 0
+    _clues             = None
+    _grid              = None
+    _options           = None
+    _viable            = True
+    _backtrackingScore = 0
 
 
     ############
     # CREATORS #
     ############
+    def __init__(self, clues):
+        # This is the creator of the class. It takes the clues of the puzzle,
+        # and propagates them, so the options of each cell are already reduced
+        # when the object is created.
+        #
+        # INPUT:
+        #  - clues: Either a string with the grid in a single line, as read by
+        #           gridReader, or a list (or bytes, as the ones yielded by
+        #           puzzleReader) of N^2 integers, row by row, with zeros on
+        #           the empty cells.
+        #
+        if isinstance(clues, str):
+            clues = gridReader(clues)
+        N = isqrt(len(clues))
+        n = isqrt(N)
+        if N*N != len(clues) or n*n != N:
+            raise ValueError("The number of cells is not a valid grid size.")
+        self._size = N
+        self._boxSize = n
+        self._clues = list(clues)
+        self._grid = [0]*(N*N)
+        self._options = [(1 << N) - 1]*(N*N)
+        self._backtrackingScore = 0
+        self._viable = self._propagateClues(enumerate(self._clues))
 
 
     ###########
     # GETTERS #
     ###########
+    def getSize(self):
+        # Returns the size (N) of the side of the grid.
+        return self._size
+
+    def getBoxSize(self):
+        # Returns the size (n) of the side of the boxes.
+        return self._boxSize
+
+    def getClues(self):
+        # Returns the list with the original clues.
+        return self._clues
+
+    def getGrid(self):
+        # Returns the grid in the current state.
+        return self._grid
+
+    def getOptions(self):
+        # Returns the list with the bitmask of the options of each cell.
+        return self._options
+
+    def getBacktrackingScore(self):
+        # Returns the number of values tried by the last search.
+        return self._backtrackingScore
+
+    def isViable(self):
+        # Returns False if the puzzle has been found to have no solution.
+        return self._viable
 
 
     ###########
-    # SETTERS #
+    # METHODS #
     ###########
+    def fullGrid(self):
+        # This method returns true if and only if the grid does not contain any
+        # unfilled (zero) cell.
+        return 0 not in self._grid
+
+    def getLine(self, blank = "."):
+        # Returns the grid in the current state as a single line.
+        return gridWriter(self.getGrid(), blank)
+
+    def solve(self, strategy = BACKTRACKING):
+        # This method invokes the different methods of solution for the puzzle.
+        # It accepts one optional input, and returns True if and only if the
+        # grid could be completed.
+        #
+        # INPUT:
+        #  - strategy: A string that specifies the solution strategy to follow.
+        #
+        if strategy == BACKTRACKING:
+            return self.backtrackingSolve()
+        if strategy == DANCING_LINKS:
+            return self.dancingLinksSolve()
+        if strategy == SAT:
+            return self.satSolve()
+        raise ValueError("Unknown strategy: " + str(strategy))
+
+    def backtrackingSolve(self):
+        # This method completes the grid with the first solution found by the
+        # backtracking search, if there is any. If the puzzle has no solution,
+        # the grid is left as it was, and the puzzle is marked as not viable.
+        #
+        self._backtrackingScore = 0
+        if not self._viable:
+            return False
+        if self.fullGrid():
+            return True
+        solutions = []
+        score = [0]
+        _search(self._options, self._grid, self._solverTables(),
+                (1 << self._size) - 1, 1, solutions, score)
+        self._backtrackingScore = score[0]
+        if solutions:
+            self._grid = solutions[0]
+            self._options = [1 << (v-1) for v in self._grid]
+            return True
+        self._viable = False
+        return False
+
+    def countSolutions(self, limit = 2):
+        # This method counts the solutions of the puzzle, up to the limit,
+        # starting from the current (already propagated) state. Each branch of
+        # the search starts from a copy of the propagated state of its parent,
+        # so nothing is solved twice. The grid is not modified.
+        #
+        # INPUT:
+        #  - limit: OPTIONAL, the number of solutions after which the count
+        #           stops.
+        #
+        self._backtrackingScore = 0
+        if not self._viable:
+            return 0
+        if self.fullGrid():
+            return 1
+        solutions = []
+        score = [0]
+        _search(list(self._options), list(self._grid), self._solverTables(),
+                (1 << self._size) - 1, limit, solutions, score)
+        self._backtrackingScore = score[0]
+        return len(solutions)
+
+    def dancingLinksSolve(self):
+        # This method completes the grid with the first solution found by the
+        # exact cover search over the original clues. The number of rows tried
+        # is kept as the backtracking score.
+        #
+        self._backtrackingScore = 0
+        if not self._viable:
+            return False
+        solutions, nodes = exactCoverSolutions(self._clues, 1)
+        self._backtrackingScore = nodes
+        if solutions:
+            self._grid = solutions[0]
+            self._options = [1 << (v-1) for v in self._grid]
+            return True
+        self._viable = False
+        return False
+
+    def satSolve(self, solver = None, timeout = None):
+        # This method completes the grid with a model of the formula of
+        # sudokuCNF, found by an external SAT solver or, if none is given, by
+        # puzzles.dpll.
+        #
+        # INPUT:
+        #  - solver: OPTIONAL, the command of the SAT solver, as in
+        #            puzzles.solveCNF.
+        #  - timeout: OPTIONAL, the number of seconds the solver can run.
+        #
+        self._backtrackingScore = 0
+        if not self._viable:
+            return False
+        model = solveCNF(sudokuCNF(self._clues), solver, timeout)
+        if model is not None:
+            self._grid = sudokuGrid(model, self._size)
+            self._options = [1 << (v-1) for v in self._grid]
+            return True
+        self._viable = False
+        return False
+
+    def _propagateClues(self, clues):
+        # Sets the options of the cells of the pairs (cell, value) of clues,
+        # and propagates them. Returns False if a value is not valid, or two
+        # clues on the same cell differ, or propagation finds a contradiction.
+        queue = []
+        for c, v in clues:
+            if v:
+                if not 0 < v <= self._size or \
+                   not self._options[c] & (1 << (v-1)):
+                    return False
+                self._options[c] = 1 << (v-1)
+                queue.append(c)
+        tables = self._solverTables()
+        return _propagate(self._options, self._grid, queue, tables,
+                          (1 << self._size) - 1, set(range(len(tables[0]))))
+
+    def _solverTables(self):
+        # Returns the tables of _scopeTables used by the solver.
+        return _tables(self._boxSize)
+
+
+
+##########################
+##########################
+##                      ##
+##  CLASS SCOPEDPUZZLE  ##
+##                      ##
+##########################
+##########################
+class ScopedPuzzle(SudokuPuzzle):
+    # This class is a puzzle given by an arbitrary scope matrix (see
+    # scopeMatrix): any number of cells, each of which takes a value in
+    # 1,2,...,N, where N is the number of cells of each scope, and every scope
+    # has each value exactly once. Latin squares (latinScopes), X-sudokus
+    # (diagonalScopes), windokus (windokuScopes) and jigsaws (jigsawScopes)
+    # are all solved by the propagation and search of SudokuPuzzle, with the
+    # peers and the scopes of each cell taken from scopeIndex.
+    #
+    # NOTE:
+    #  - The Dancing Links strategy is not available for these puzzles.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    _scopes = None
+    _tables = None
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, clues, scopes):
+        # This is the creator of the class. It takes the clues and the scopes
+        # of the puzzle, and propagates the clues.
+        #
+        # INPUT:
+        #  - clues: Either a string with one character per cell, with the
+        #           values in the first N characters of "123456789ABCDEFG"
+        #           and anything else on the empty cells, or a list (or
+        #           bytes) of integers, with zeros on the empty cells.
+        #  - scopes: A scope matrix, or anything that scopeMatrix accepts.
+        #
+        scopes = scopeMatrix(scopes)
+        N = scopes.shape[1]
+        if isinstance(clues, str):
+            values = {c : k+1 for k, c in enumerate(ALPHABET[:N])}
+            clues = [values.get(c, 0) for c in clues]
+        if scopes.min() < 0 or scopes.max() >= len(clues):
+            raise ValueError("The scopes refer to cells that do not exist.")
+        self._size = N
+        self._scopes = scopes
+        self._clues = list(clues)
+        self._grid = [0]*len(clues)
+        self._options = [(1 << N) - 1]*len(clues)
+        self._backtrackingScore = 0
+        self._viable = self._propagateClues(enumerate(self._clues))
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getScopes(self):
+        # Returns the scope matrix.
+        return self._scopes
+
 
     ###########
     # METHODS #
     ###########
-    pass
+    def dancingLinksSolve(self):
+        # The exact cover of exactCoverSolutions is only built for standard
+        # sudokus.
+        raise ValueError("Dancing Links is not available for these puzzles.")
+
+    def satSolve(self, solver = None, timeout = None):
+        # This method completes the grid with a model of the formula of
+        # sudokuCNF over the scopes of the puzzle, starting from the cells
+        # already filled by propagation, as in the method of SudokuPuzzle.
+        #
+        self._backtrackingScore = 0
+        if not self._viable:
+            return False
+        scopes = self._solverTables()[0]
+        model = solveCNF(sudokuCNF(self._grid, scopes), solver, timeout)
+        if model is not None:
+            self._grid = sudokuGrid(model, self._size, len(self._grid))
+            self._options = [1 << (v-1) for v in self._grid]
+            return True
+        self._viable = False
+        return False
+
+    def _solverTables(self):
+        # Returns the tables of _scopeTables for the scopes of the puzzle.
+        if self._tables is None:
+            self._tables = _scopeTables(self._scopes, len(self._grid))
+        return self._tables
+
+
+
+###########################
+###########################
+##                       ##
+##  CLASS SAMURAIPUZZLE  ##
+##                       ##
+###########################
+###########################
+class SamuraiPuzzle(ScopedPuzzle):
+    # This class is a samurai sudoku, made of five overlapping 9x9 grids. It
+    # works as a ScopedPuzzle whose cells are the 369 distinct cells of
+    # samuraiScopes, so the boxes shared by two grids are a single set of
+    # options, and a value deduced on one grid is seen at once by the other.
+    # The clues, getGrid and getLine use the 405 positions of the lines, with
+    # the shared boxes repeated.
+    #
+
+    ##############
+    # ATTRIBUTES #
+    ##############
+    _cells = None
+
+
+    ############
+    # CREATORS #
+    ############
+    def __init__(self, clues):
+        # This is the creator of the class. It takes the 405 clues of the
+        # puzzle, and propagates them.
+        #
+        # INPUT:
+        #  - clues: Either a string of 405 characters, with the values of the
+        #           five grids in "123456789" and anything else on the empty
+        #           cells, or a list (or bytes, as the ones yielded by
+        #           puzzleReader) of 405 integers.
+        #
+        if isinstance(clues, str):
+            clues = [int(c) if c in ALPHABET[:9] else 0 for c in clues]
+        if len(clues) != 405:
+            raise ValueError("A samurai sudoku must have 405 cells.")
+        cells, scopes, tables = _samuraiLayout()
+        self._size = 9
+        self._boxSize = 3
+        self._scopes = scopes
+        self._tables = tables
+        self._cells = cells
+        self._clues = list(clues)
+        self._grid = [0]*369
+        self._options = [511]*369
+        self._backtrackingScore = 0
+        self._viable = self._propagateClues(zip(cells, self._clues))
+
+
+    ###########
+    # GETTERS #
+    ###########
+    def getGrid(self):
+        # Returns the 405 values of the five grids in the current state.
+        return [self._grid[c] for c in self._cells]
+
+
+
+if __name__ == "__main__":
+    main()
 
 
 
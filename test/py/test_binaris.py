@@ -0,0 +1,35 @@
+# Tests for the module binaris. Run with pytest from the root of the
+# repository.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..",
+                                "scr", "py"))
+
+from binaris import allBoards, countBoards
+
+
+@pytest.mark.parametrize("M, count", [(2, 2), (4, 72), (6, 4140),
+                                      (8, 4111116)])
+def test_countBoards_distinct(M, count):
+    assert countBoards(M, workers = 1) == count
+
+
+@pytest.mark.parametrize("M, count", [(2, 2), (4, 90), (6, 11222),
+                                      (8, 12413918)])
+def test_countBoards_repeated(M, count):
+    assert countBoards(M, distinct = False, workers = 1) == count
+
+
+def test_countBoards_small_chunks():
+    # Parts of a few halves must add up to the same count.
+    assert countBoards(6, workers = 1, chunksize = 1) == 4140
+    assert countBoards(8, workers = 2, chunksize = 4096) == 4111116
+
+
+@pytest.mark.parametrize("M", [4, 6])
+def test_countBoards_matches_allBoards(M):
+    assert countBoards(M, workers = 1) == sum(1 for _ in allBoards(M))
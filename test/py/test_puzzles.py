@@ -0,0 +1,42 @@
+# Tests for the module puzzles. Run with pytest from the root of the
+# repository.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..",
+                                "scr", "py"))
+
+from puzzles import randomLatinSquareJM, randomLatinSquaresJM
+
+
+def _isLatin(square):
+    n = square.shape[0]
+    symbols = list(range(n))
+    return all(sorted(row) == symbols for row in square.tolist()) and \
+           all(sorted(col) == symbols for col in square.T.tolist())
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 8, 13])
+def test_randomLatinSquareJM_conjugates(n):
+    xy, xz, yz = randomLatinSquareJM(n, n)
+    assert _isLatin(xy) and _isLatin(xz) and _isLatin(yz)
+    for i in range(n):
+        for j in range(n):
+            k = xy[i,j]
+            assert xz[i,k] == j and yz[j,k] == i
+
+
+def test_randomLatinSquareJM_seed():
+    assert np.array_equal(randomLatinSquareJM(10, 7)[0],
+                          randomLatinSquareJM(10, 7)[0])
+
+
+def test_randomLatinSquaresJM():
+    squares = randomLatinSquaresJM(9, 12, 3)
+    assert squares.shape == (12, 9, 9)
+    assert all(_isLatin(square) for square in squares)
+    assert len({square.tobytes() for square in squares}) > 1
@@ -0,0 +1,59 @@
+# Tests for the module skyscraper. Run with pytest from the root of the
+# repository.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..",
+                                "scr", "py"))
+
+from puzzles import randomIsotopicLatinSquare, randomLatinSquaresJM
+from skyscraper import generateLURD, generateLURDs
+
+
+def _visible(line):
+    # Counts the heights of a line seen from its start, one cell at a time.
+    tallest, count = 0, 0
+    for height in line:
+        if height > tallest:
+            tallest, count = height, count + 1
+    return count
+
+
+def _loopLURD(board):
+    # Clues of a board computed cell by cell, as generateLURD used to.
+    n = board.shape[0]
+    return np.array([[_visible(board[j,:]) for j in range(n)],
+                     [_visible(board[:,j]) for j in range(n)],
+                     [_visible(board[j,::-1]) for j in range(n)],
+                     [_visible(board[::-1,j]) for j in range(n)]])
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 5, 7, 9, 12])
+def test_generateLURDs_matches_loop(n):
+    rng = np.random.default_rng(n)
+    # The squares of the Jacobson and Matthews walk have the symbols
+    # 0,1,...,n-1, in a small unsigned type, so they are shifted to 1,...,n.
+    boards = np.concatenate([
+        np.stack([randomIsotopicLatinSquare(n, rng) for _ in range(20)]),
+        randomLatinSquaresJM(n, 20, rng).astype(int) + 1])
+    lurds = generateLURDs(boards)
+    assert lurds.shape == (len(boards), 4, n)
+    for board, lurd in zip(boards, lurds):
+        expected = _loopLURD(board)
+        assert np.array_equal(lurd, expected)
+        assert np.array_equal(generateLURD(board), expected)
+
+
+def test_generateLURD_known_board():
+    board = np.array([[1, 2, 3, 4],
+                      [2, 3, 4, 1],
+                      [3, 4, 1, 2],
+                      [4, 1, 2, 3]])
+    assert generateLURD(board).tolist() == [[4, 3, 2, 1],
+                                            [4, 3, 2, 1],
+                                            [1, 2, 2, 2],
+                                            [1, 2, 2, 2]]